@@ -0,0 +1,195 @@
+#!/home/heisenberg/anaconda3/bin/python
+
+"""
+Benchmarks for the simulation building blocks.
+The scheduler benchmark is the classic hold model: the queue is filled with a number of
+pending events, then every operation pops the earliest event and pushes a new one a random
+(exponential) time later, so the queue size stays fixed. It shows which backend wins at
+which pending event count.
+The engine benchmark runs every simulation engine over a grid of k and rho (mu = 1, a horizon
+sized for about the same number of events everywhere) and records events per second, wall
+time and peak traced memory. Events are counted as two per customer served, so the figures
+compare across engines. Results can be saved as a JSON baseline; comparing against one fails
+the run (exit status 1) when any point is slower than the baseline by more than a threshold,
+or when none of the points is in the baseline; points missing from it are listed.
+
+    python Benchmark.py --save baseline.json
+    python Benchmark.py --compare baseline.json --threshold 0.2
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from Scheduler import SCHEDULERS, makeScheduler
+from Sweep import ENGINES, loadAttr
+
+
+ENGINE_KS = (1, 10, 100, 1000)
+ENGINE_RHOS = (0.1, 0.5, 0.9, 0.99)
+
+
+def holdBenchmark(name, pending, operations, seed=101):
+    rng = random.Random(seed)
+    queue = makeScheduler(name)
+    seq = 0
+    for i in range(pending):
+        seq += 1
+        queue.push((rng.expovariate(1.0), seq, 0, -1))
+
+    # the increments are drawn up front so only the queue operations are timed
+    increments = [rng.expovariate(1.0) * pending for i in range(operations)]
+
+    start = time.perf_counter()
+    for increment in increments:
+        event = queue.pop()
+        seq += 1
+        queue.push((event[0] + increment, seq, 0, -1))
+    elapsed = time.perf_counter() - start
+
+    return elapsed / operations
+
+
+def benchmarkSchedulers(sizes=(10, 100, 1000, 10000, 100000), operations=200000):
+    names = list(SCHEDULERS)
+    results = {}
+
+    print(f'{"pending":>10}' + ''.join(f'{name:>12}' for name in names) + f'{"fastest":>12}')
+    for pending in sizes:
+        timings = {name: holdBenchmark(name, pending, operations) for name in names}
+        results[pending] = timings
+        fastest = min(timings, key=timings.get)
+        print(f'{pending:>10}' + ''.join(f'{timings[name] * 1e9:>10.0f}ns' for name in names) + f'{fastest:>12}')
+
+    return results
+
+
+def benchmarkKey(engine, k, rho):
+    return f'{engine}/k={k}/rho={rho}'
+
+
+def runEngine(engine, k, rho, timeLimit, seed):
+    Params = loadAttr('Experiment_3.Params')
+    simulatorPath, statesPath = ENGINES[engine]
+    sim = loadAttr(simulatorPath)(seed)
+    sim.configure(Params(rho * k, 1.0, k, timeLimit), loadAttr(statesPath)())
+    sim.run()
+    return sim
+
+
+def engineBenchmark(engine, k, rho, events=200000, seed=101, memory=True, repeat=3):
+    # best wall time of repeat identical runs; peak memory from one more, traced run since
+    # tracemalloc slows the run down too much to time it at the same time
+    timeLimit = events / (2.0 * rho * k)
+    wallTime = float('inf')
+    for i in range(repeat):
+        start = time.perf_counter()
+        sim = runEngine(engine, k, rho, timeLimit, seed)
+        wallTime = min(wallTime, time.perf_counter() - start)
+    processed = 2 * sim.states.totalServed
+
+    peakMemory = None
+    if memory:
+        tracemalloc.start()
+        runEngine(engine, k, rho, timeLimit, seed)
+        peakMemory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'engine': engine,
+        'k': k,
+        'rho': rho,
+        'events': processed,
+        'wallTime': wallTime,
+        'eventsPerSecond': processed / wallTime,
+        'peakMemory': peakMemory,  # bytes
+    }
+
+
+def benchmarkEngines(engines=tuple(ENGINES), ks=ENGINE_KS, rhos=ENGINE_RHOS, events=200000, memory=True, repeat=3):
+    results = {}
+    print(f'{"engine":>12}{"k":>6}{"rho":>6}{"events/s":>12}{"wall":>10}{"peak MiB":>10}')
+    for engine in engines:
+        for k in ks:
+            # the Lindley engine only simulates a single server
+            if engine == 'lindley' and k != 1:
+                continue
+            for rho in rhos:
+                result = engineBenchmark(engine, k, rho, events, memory=memory, repeat=repeat)
+                results[benchmarkKey(engine, k, rho)] = result
+                peak = f'{result["peakMemory"] / 2 ** 20:>10.1f}' if memory else f'{"-":>10}'
+                print(f'{engine:>12}{k:>6}{rho:>6}{result["eventsPerSecond"]:>12.0f}{result["wallTime"]:>9.2f}s{peak}')
+    return results
+
+
+def saveBaseline(results, path):
+    baseline = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+
+
+def compareBaseline(results, path, threshold=0.2):
+    # (regressions, missing): the (key, baseline events/s, current events/s) that slowed down
+    # by more than threshold, and the keys of the points the baseline has no figure for
+    with open(path) as f:
+        baseline = json.load(f)['results']
+
+    regressions = []
+    missing = []
+    for key, result in results.items():
+        if key not in baseline:
+            missing.append(key)
+            continue
+        before = baseline[key]['eventsPerSecond']
+        if result['eventsPerSecond'] < before * (1.0 - threshold):
+            regressions.append((key, before, result['eventsPerSecond']))
+    return regressions, missing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the schedulers and the simulation engines.')
+    parser.add_argument('--schedulers', action='store_true', help='run the scheduler hold benchmark instead')
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES), default=list(ENGINES))
+    parser.add_argument('--k', nargs='+', type=int, default=list(ENGINE_KS))
+    parser.add_argument('--rho', nargs='+', type=float, default=list(ENGINE_RHOS))
+    parser.add_argument('--events', type=int, default=200000, help='about this many events per run')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per point, the fastest counts')
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced peak memory runs')
+    parser.add_argument('--save', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', help='JSON baseline to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown')
+    args = parser.parse_args(argv)
+
+    if args.schedulers:
+        benchmarkSchedulers()
+        return
+
+    results = benchmarkEngines(args.engines, args.k, args.rho, args.events, not args.no_memory, args.repeat)
+    if args.save:
+        saveBaseline(results, args.save)
+
+    if args.compare:
+        regressions, missing = compareBaseline(results, args.compare, args.threshold)
+        for key in missing:
+            print(f'MISSING {key}: not in {args.compare}')
+        for key, before, after in regressions:
+            print(f'SLOWER {key}: {before:.0f} -> {after:.0f} events/s ({after / before - 1.0:+.1%})')
+        if len(missing) == len(results):
+            print(f'No point of the grid is in {args.compare}, nothing was compared')
+            sys.exit(1)
+        if regressions:
+            sys.exit(1)
+        print(f'No slowdown beyond {args.threshold:.0%} against {args.compare} '
+              f'({len(results) - len(missing)} points compared)')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Persistent on-disk cache of simulation results.
+Results are stored in a local SQLite file under a content hash of everything that
+determines them: lambda, mu, k, timeLimit, seed, the engine name, the run options and a
+version hash of the engine's source files, so editing an engine invalidates its entries
+by itself. Every entry records its size and last access; once the store grows past
+maxBytes the least recently used entries are evicted.
+"""
+
+import functools
+import hashlib
+import importlib
+import json
+import os
+import sqlite3
+import time
+
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.simcache', 'results.sqlite')
+
+# modules every engine depends on besides its own simulator and States; Sweep.runPoint
+# decides how a point is run (sequential stopping, warm-up, divergence watch)
+SHARED_MODULES = ('Events', 'Scheduler', 'Variates', 'Sequential', 'Warmup', 'MultiQueue', 'Stability', 'Sketch',
+                  'Histogram', 'Sweep')
+
+
+@functools.lru_cache(maxsize=None)
+def engineVersion(engine):
+    # hash of the source of every module the engine's results depend on
+    from Sweep import ENGINES
+
+    modules = {path.rsplit('.', 1)[0] for path in ENGINES[engine]} | set(SHARED_MODULES)
+    digest = hashlib.sha256()
+    for name in sorted(modules):
+        with open(importlib.import_module(name).__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def makeKey(engine, lambd, mu, k, timeLimit, seed, **options):
+    fields = {
+        'engine': engine,
+        'version': engineVersion(engine),
+        'lambd': lambd,
+        'mu': mu,
+        'k': k,
+        'timeLimit': timeLimit,
+        'seed': seed,
+        'options': options,
+    }
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, path=DEFAULT_PATH, maxBytes=64 * 1024 * 1024):
+        self.path = path
+        self.maxBytes = maxBytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS results ('
+                        'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, lastAccess REAL NOT NULL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS lru ON results (lastAccess)')
+        self.db.commit()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        row = self.db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.db.execute('UPDATE results SET lastAccess = ? WHERE key = ?', (time.time(), key))
+        self.db.commit()
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        # value can be anything JSON serializable: a getResults() tuple, replication stats, ...
+        text = json.dumps(value)
+        self.db.execute('INSERT OR REPLACE INTO results (key, value, size, lastAccess) VALUES (?, ?, ?, ?)',
+                        (key, text, len(key) + len(text), time.time()))
+        self.evict()
+        self.db.commit()
+
+    def size(self):
+        return self.db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def evict(self):
+        excess = self.size() - self.maxBytes
+        if excess <= 0:
+            return
+
+        # walk the entries from least recently used until enough bytes are freed
+        victims = []
+        for key, size in self.db.execute('SELECT key, size FROM results ORDER BY lastAccess'):
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+        self.db.executemany('DELETE FROM results WHERE key = ?', victims)
+
+    def clear(self):
+        self.db.execute('DELETE FROM results')
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
@@ -0,0 +1,102 @@
+"""
+Event queue free engine for M/M/k with a single FCFS queue.
+With exponential interarrival and service times the system is a birth-death chain on the
+number of customers n: arrivals happen at rate lambda and departures at rate
+mu * min(n, k). Instead of keeping one pending departure per busy server, the engine
+draws the time to the next transition from the total rate and picks arrival or departure
+by the ratio of the rates, so every event costs O(1) whatever k is.
+Delays come from FCFS bookkeeping of the waiting customers' arrival times, and the
+statistics are written into the same States object the event simulator uses.
+"""
+
+from collections import deque
+
+from Variates import blockStream, makeStreams, uniformStream
+
+
+class CtmcSimulator:
+    def __init__(self, seed, blockSize=4096, antithetic=None):
+        self.simclock = 0
+        self.seed = seed
+        self.blockSize = blockSize  # how many variates are generated at once per stream
+        self.antithetic = antithetic  # None, or False/True for the two runs of an antithetic pair
+        self.params = None
+        self.states = None
+
+    def configure(self, params, states):
+        self.params = params
+        self.states = states
+
+    def now(self):
+        return self.simclock
+
+    def run(self):
+        jumpRng, choiceRng = makeStreams(self.seed)
+        jumps = blockStream(jumpRng, self.blockSize, self.antithetic)
+        choices = uniformStream(choiceRng, self.blockSize, self.antithetic)
+
+        lambd = self.params.lambd
+        mu = self.params.mu
+        k = self.params.k
+        timeLimit = self.params.timeLimit
+
+        inSystem = 0
+        waiting = deque()  # arrival times of the customers in the queue
+        now = 0.0
+        queueArea = 0.0
+        busyArea = 0.0
+        totalDelay = 0.0
+        totalServed = 0
+        sketch = self.states.delaySketch
+        queueHistogram = self.states.queueHistogram
+        systemHistogram = self.states.systemHistogram
+
+        while True:
+            busy = inSystem if inSystem < k else k
+            rate = lambd + busy * mu
+            nextTime = now + next(jumps) / rate
+            if nextTime >= timeLimit:
+                break
+
+            timePassed = nextTime - now
+            queueArea += (inSystem - busy) * timePassed
+            busyArea += busy * timePassed
+            if queueHistogram is not None:
+                queueHistogram.add(inSystem - busy, timePassed)
+                systemHistogram.add(inSystem, timePassed)
+            now = nextTime
+
+            if next(choices) * rate < lambd:
+                # arrival, served right away if a server is idle
+                if inSystem < k:
+                    totalServed += 1
+                    if sketch is not None:
+                        sketch.update(0.0)
+                else:
+                    waiting.append(now)
+                inSystem += 1
+            else:
+                # departure, the head of the queue (if any) takes the freed server
+                inSystem -= 1
+                if inSystem >= k:
+                    delay = now - waiting.popleft()
+                    totalDelay += delay
+                    totalServed += 1
+                    if sketch is not None:
+                        sketch.update(delay)
+
+        self.states.totalServed = totalServed
+        self.states.totalDelay = totalDelay
+        self.states.queueArea = queueArea
+        self.states.totalServingTime = busyArea / k
+        self.states.timeOfLastEvent = now
+        self.states.peopleInQueue = len(waiting)
+
+        self.simclock = now
+        self.states.finish(self)
+
+    def printResults(self):
+        self.states.printResults(self)
+
+    def getResults(self):
+        return self.states.getResults(self)
@@ -0,0 +1,22 @@
+"""
+Compact event records for the simulators' event queue.
+An event is a plain tuple (eventTime, seq, kind, server) instead of an object per event:
+kind is one of the integer constants below, seq is a running counter that orders events
+with equal times by scheduling order, and server is the index of the server a departure
+belongs to (NO_SERVER when it does not matter). Simulator.run() dispatches on kind
+through a table of handler functions.
+"""
+
+START = 0
+ARRIVAL = 1
+DEPARTURE = 2
+EXIT = 3
+CHECKPOINT = 4  # periodic hook for run-time monitors such as sequential stopping
+
+EVENT_NAMES = ('START', 'ARRIVAL', 'DEPARTURE', 'EXIT', 'CHECKPOINT')
+
+NO_SERVER = -1
+
+
+def eventName(event):
+    return EVENT_NAMES[event[2]]
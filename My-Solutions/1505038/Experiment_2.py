@@ -9,10 +9,16 @@ For the sake of comparison, while plotting results from simulation, also produce
 """
 
 import enum
-import heapq
-import random
 
-import matplotlib.pyplot as plt
+from Lindley import LindleySimulator
+from Analytic import analyticResults
+from Events import START, ARRIVAL, DEPARTURE, EXIT, NO_SERVER
+from Histogram import TimeHistogram
+from Replication import runExperimentSweep
+from Reporting import renderFigures, sweepFigure
+from Scheduler import makeScheduler
+from Sketch import KllSketch
+from Variates import ExpoVariates
 
 
 # Using enum class create enumerations
@@ -38,11 +44,12 @@ class Params:
 
 # States and statistical counters
 class States:
-    def __init__(self):
+    def __init__(self, sketch=False, histograms=False):
         # States
         self.queue = []  # just stores the arrival times
         # Declare other states variables that might be needed
         self.totalDelay = 0.0
+        self.delaySketch = KllSketch() if sketch else None  # every customer's delay, for the delay quantiles
         self.totalServed = 0
         # Statistics
         self.util = 0.0
@@ -55,17 +62,19 @@ class States:
         self.timePassedSinceLastEvent = 0.0
 
         self.queueArea = 0.0
+        self.queueHistogram = TimeHistogram() if histograms else None  # time spent with n customers waiting
+        self.systemHistogram = TimeHistogram() if histograms else None  # time spent with n customers in the system
 
         # My added variables
         self.serverUtilizationFactor = 0.0
         self.serverStatus = ServerState.IDLE
         self.peopleInQueue = 0
 
-    def update(self, sim, event):
+    def update(self, sim, eventTime):
         # Complete this function
-        self.timePassedSinceLastEvent = event.eventTime - self.timeOfLastEvent
+        self.timePassedSinceLastEvent = eventTime - self.timeOfLastEvent
         # print(self.timePassedSinceLastEvent)
-        self.timeOfLastEvent = event.eventTime
+        self.timeOfLastEvent = eventTime
 
         lastEventServingTime = int(self.serverStatus) * self.timePassedSinceLastEvent
         # print(int(self.serverStatus))
@@ -75,6 +84,10 @@ class States:
         areaToBeAdded = self.peopleInQueue * self.timePassedSinceLastEvent
         self.queueArea += areaToBeAdded
 
+        if self.queueHistogram is not None:
+            self.queueHistogram.add(self.peopleInQueue, self.timePassedSinceLastEvent)
+            self.systemHistogram.add(self.peopleInQueue + int(self.serverStatus), self.timePassedSinceLastEvent)
+
     def finish(self, sim):
         # Complete this function
         if self.totalServed != 0:
@@ -101,122 +114,90 @@ class States:
     def getResults(self, sim):
         return self.avgQlength, self.avgQdelay, self.util
 
+    def getDelayQuantiles(self, qs=(0.5, 0.95, 0.99)):
+        # from the sketch, so approximate
+        if self.delaySketch is None:
+            raise ValueError('Delay quantiles need a States(sketch=True).')
+        return tuple(self.delaySketch.quantiles(qs))
 
-# Write more functions if required
-
-
-class Event:
-    def __init__(self, sim):
-        self.eventType = None
-        self.sim = sim
-        self.eventTime = None
-
-    def process(self, sim):
-        raise Exception('Unimplemented process method for the event!')
-
-    def __repr__(self):
-        return self.eventType
-
-
-class StartEvent(Event):
-    def __init__(self, eventTime, sim):
-        self.eventTime = eventTime
-        self.eventType = 'START'
-        self.sim = sim
 
-    def process(self, sim):
-        # Complete this function
-        # initiate the first arrival event
-        nextArrivalEventTime = self.eventTime + random.expovariate(sim.params.lambd)
-        sim.scheduleEvent(ArrivalEvent(nextArrivalEventTime, sim))
-
-        # push the exit event too.
-        sim.scheduleEvent(ExitEvent(sim.params.timeLimit, sim))
-
-
-class ExitEvent(Event):
-    def __init__(self, eventTime, sim):
-        self.eventTime = eventTime
-        self.eventType = 'EXIT'
-        self.sim = sim
+# Write more functions if required
 
-    def process(self, sim):
-        # Complete this function
-        print('This is an EXIT event. Time: ', self.eventTime)
 
+# Event handlers, Simulator.run() looks them up by the event kind
+def processStart(sim, eventTime, server):
+    # initiate the first arrival event
+    nextArrivalEventTime = eventTime + sim.variates.arrival(sim.params.lambd)
+    sim.scheduleEvent(ARRIVAL, nextArrivalEventTime)
 
-class ArrivalEvent(Event):
-    # Write __init__ function
-    def __init__(self, eventTime, sim):
-        super().__init__(sim)
-        self.eventType = 'ARRIVAL'
-        self.sim = sim
-        self.eventTime = eventTime
+    # push the exit event too.
+    sim.scheduleEvent(EXIT, sim.params.timeLimit)
 
-    def process(self, sim):
-        # Complete this function
-        # this customer has not arrived yet. he will come after 'random.expovariate(sim.params.lambd)'
-        # time later than now.
 
-        # Scheduling next arrival before processing current arrival event
-        nextArrivalEventTime = sim.now() + random.expovariate(sim.params.lambd)
-        sim.scheduleEvent(ArrivalEvent(nextArrivalEventTime, sim))  # scheduling next arrival event
+def processArrival(sim, eventTime, server):
+    # this customer has not arrived yet. he will come after 'sim.variates.arrival(sim.params.lambd)'
+    # time later than now.
 
-        # process current arrival event now
-        if sim.states.serverStatus == ServerState.IDLE:
-            # no delay except service delay
-            currentEventServiceDuration = random.expovariate(sim.params.mu)
-            currentEventDepartureTime = sim.now() + currentEventServiceDuration
+    # Scheduling next arrival before processing current arrival event
+    nextArrivalEventTime = sim.now() + sim.variates.arrival(sim.params.lambd)
+    sim.scheduleEvent(ARRIVAL, nextArrivalEventTime)  # scheduling next arrival event
 
-            sim.states.totalServed += 1
-            sim.states.serverStatus = ServerState.BUSY
+    # process current arrival event now
+    if sim.states.serverStatus == ServerState.IDLE:
+        # no delay except service delay
+        currentEventServiceDuration = sim.variates.service(sim.params.mu)
+        currentEventDepartureTime = sim.now() + currentEventServiceDuration
 
-            currentEventDelay = 0
-            sim.states.totalDelay += currentEventDelay
+        sim.states.totalServed += 1
+        sim.states.serverStatus = ServerState.BUSY
 
-            sim.scheduleEvent(DepartureEvent(currentEventDepartureTime, sim))
+        currentEventDelay = 0
+        sim.states.totalDelay += currentEventDelay
+        if sim.states.delaySketch is not None:
+            sim.states.delaySketch.update(currentEventDelay)
 
-        elif sim.states.serverStatus == ServerState.BUSY:
-            sim.states.peopleInQueue += 1
-            sim.states.queue.append(sim.now())
+        sim.scheduleEvent(DEPARTURE, currentEventDepartureTime)
 
+    elif sim.states.serverStatus == ServerState.BUSY:
+        sim.states.peopleInQueue += 1
+        sim.states.queue.append(sim.now())
 
-class DepartureEvent(Event):
-    # Write __init__ function
-    def __init__(self, eventTime, sim):
-        super().__init__(sim)
-        self.sim = sim
-        self.eventTime = eventTime
-        self.eventType = 'DEPARTURE'
 
-    def process(self, sim):
-        # Complete this function
-        if len(sim.states.queue) == 0:
-            sim.states.serverStatus = ServerState.IDLE
-        else:
-            nextDepartureEventTime = sim.now() + random.expovariate(sim.params.mu)
-            sim.scheduleEvent(DepartureEvent(nextDepartureEventTime, sim))
+def processDeparture(sim, eventTime, server):
+    if len(sim.states.queue) == 0:
+        sim.states.serverStatus = ServerState.IDLE
+    else:
+        nextDepartureEventTime = sim.now() + sim.variates.service(sim.params.mu)
+        sim.scheduleEvent(DEPARTURE, nextDepartureEventTime)
 
-            currentEventDelay = sim.now() - sim.states.queue[0]
-            sim.states.totalDelay += currentEventDelay
+        currentEventDelay = sim.now() - sim.states.queue[0]
+        sim.states.totalDelay += currentEventDelay
+        if sim.states.delaySketch is not None:
+            sim.states.delaySketch.update(currentEventDelay)
 
-            sim.states.totalServed += 1
+        sim.states.totalServed += 1
 
-            sim.states.peopleInQueue -= 1
-            sim.states.queue.pop(0)
+        sim.states.peopleInQueue -= 1
+        sim.states.queue.pop(0)
 
 
 class Simulator:
-    def __init__(self, seed):
-        self.eventQ = []
+    def __init__(self, seed, blockSize=4096, scheduler='heap', antithetic=None):
+        self.eventQ = makeScheduler(scheduler)  # 'heap', 'calendar' or 'ladder'
+        self.seq = 0  # events scheduled so far, also breaks ties between equal event times
+        self.handlers = (processStart, processArrival, processDeparture)
         self.simclock = 0
         self.seed = seed
+        self.blockSize = blockSize  # how many variates are generated at once per stream
+        self.antithetic = antithetic  # None, or False/True for the two runs of an antithetic pair
+        self.variates = None
         self.params = None
         self.states = None
+        self.trace = None  # optional Trace.TraceRecorder, filled with one record per event
 
     def initialize(self):
         self.simclock = 0
-        self.scheduleEvent(StartEvent(0, self))
+        self.scheduleEvent(START, 0)
 
     def configure(self, params, states):
         self.params = params
@@ -225,26 +206,54 @@ class Simulator:
     def now(self):
         return self.simclock
 
-    def scheduleEvent(self, event):
-        heapq.heappush(self.eventQ, (event.eventTime, event))
+    def scheduleEvent(self, kind, eventTime, server=NO_SERVER):
+        self.seq += 1
+        self.eventQ.push((eventTime, self.seq, kind, server))
 
     def run(self):
-        random.seed(self.seed)
+        self.variates = ExpoVariates(self.seed, self.blockSize, self.antithetic)
         self.initialize()
 
+        # the traced loop is separate so that untraced runs do not pay for it
+        if self.trace is not None:
+            self.runTraced()
+        else:
+            self.runEvents()
+
+        self.finish()
+
+    def runEvents(self):
+        while len(self.eventQ) > 0:
+            eventTime, seq, kind, server = self.eventQ.pop()
+
+            if kind == EXIT:
+                break
+
+            if self.states != None:
+                self.states.update(self, eventTime)
+
+            self.simclock = eventTime
+            self.handlers[kind](self, eventTime, server)
+
+    def runTraced(self):
+        record = self.trace.record
         while len(self.eventQ) > 0:
-            time, event = heapq.heappop(self.eventQ)
+            eventTime, seq, kind, server = self.eventQ.pop()
 
-            if event.eventType == 'EXIT':
+            if kind == EXIT:
                 break
 
             if self.states != None:
-                self.states.update(self, event)
+                self.states.update(self, eventTime)
+
+            # queue length as seen by the event, before it is processed
+            record(eventTime, kind, server, self.states.peopleInQueue)
+            self.simclock = eventTime
+            self.handlers[kind](self, eventTime, server)
 
-            # print(event.eventTime, 'Event', event)
-            self.simclock = event.eventTime
-            event.process(self)
+        self.trace.close()
 
+    def finish(self):
         self.states.finish(self)
 
     def printResults(self):
@@ -267,51 +276,38 @@ class Simulator:
         print("Server utilization factor", round(server_util_factor, 3))
 
 
-def experiment1():
+def makeSimulator(seed, vectorized=False):
+    # the vectorized Lindley engine only handles k = 1 but is a drop-in replacement there
+    if vectorized:
+        return LindleySimulator(seed)
+    return Simulator(seed)
+
+
+def experiment1(vectorized=False):
     seed = 101
-    sim = Simulator(seed)
+    sim = makeSimulator(seed, vectorized)
     sim.configure(Params(5.0 / 60, 8.0 / 60, 1), States())
     sim.run()
     sim.printResults()
     sim.print_analytical_results()
 
 
-def experiment2():
+def experiment2(vectorized=False, workers=None, replications=1, cache=None, outputDir='figures', formats=('png',)):
     seed = 110
     mu = 1000.0 / 60
     ratios = [u / 10.0 for u in range(1, 11)]
 
-    avglength = []
-    avgdelay = []
-    util = []
-
-    for ro in ratios:
-        sim = Simulator(seed)
-        sim.configure(Params(mu * ro, mu, 1), States())
-        sim.run()
-
-        length, delay, utl = sim.getResults()
-        avglength.append(length)
-        avgdelay.append(delay)
-        util.append(utl)
-
-    plt.figure(1)
-    plt.subplot(311)
-    plt.plot(ratios, avglength)
-    plt.xlabel('Ratio (ro)')
-    plt.ylabel('Avg Q length')
-
-    plt.subplot(312)
-    plt.plot(ratios, avgdelay)
-    plt.xlabel('Ratio (ro)')
-    plt.ylabel('Avg Q delay (sec)')
-
-    plt.subplot(313)
-    plt.plot(ratios, util)
-    plt.xlabel('Ratio (ro)')
-    plt.ylabel('Util')
-
-    plt.show()
+    # every ratio is an independent run, so the sweep is spread over worker processes
+    engine = 'lindley' if vectorized else 'event'
+    paramsList = [Params(mu * ro, mu, 1) for ro in ratios]
+    results, errors = runExperimentSweep(paramsList, seed, engine, workers, replications, cache)
+
+    # analytic curves to overlay, computed for the whole sweep at once
+    analytic = analyticResults([mu * ro for ro in ratios], mu, 1)
+
+    # written to outputDir with the Agg backend instead of shown in a window
+    figure = sweepFigure('experiment2', ratios, results, 'Ratio (ro)', errors, analytic)
+    return renderFigures([figure], outputDir, formats)
 
 
 def main():
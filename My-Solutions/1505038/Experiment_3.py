@@ -9,10 +9,16 @@ For the sake of comparison, while plotting results from simulation, also produce
 """
 
 import enum
-import heapq
-import random
+from collections import deque
 
-import matplotlib.pyplot as plt
+from Analytic import analyticResults
+from Events import START, ARRIVAL, DEPARTURE, EXIT, CHECKPOINT, NO_SERVER
+from Replication import runExperimentSweep
+from Reporting import renderFigures, sweepFigure
+from Scheduler import makeScheduler
+from Histogram import TimeHistogram
+from Sketch import KllSketch
+from Variates import ExpoVariates
 
 
 # Using enum class create enumerations
@@ -38,11 +44,12 @@ class Params:
 
 # States and statistical counters
 class States:
-    def __init__(self):
+    def __init__(self, sketch=False, histograms=False):
         # States
-        self.queue = []  # just stores the arrival times
+        self.queue = deque()  # just stores the arrival times
         # Declare other states variables that might be needed
         self.totalDelay = 0.0
+        self.delaySketch = KllSketch() if sketch else None  # every customer's delay, for the delay quantiles
         self.totalServed = 0
         # Statistics
         self.util = 0.0
@@ -55,6 +62,8 @@ class States:
         self.timePassedSinceLastEvent = 0.0
 
         self.queueArea = 0.0
+        self.queueHistogram = TimeHistogram() if histograms else None  # time spent with n customers waiting
+        self.systemHistogram = TimeHistogram() if histograms else None  # time spent with n customers in the system
 
         # My added variables
         self.serverUtilizationFactor = 0.0
@@ -63,11 +72,13 @@ class States:
 
         self.serverAvailableRightNow = 0
 
-    def update(self, sim, event):
+        self.warmupTime = 0.0  # start of the steady-state window, moved by Warmup.MserWarmup
+
+    def update(self, sim, eventTime):
         # Complete this function
-        self.timePassedSinceLastEvent = event.eventTime - self.timeOfLastEvent
+        self.timePassedSinceLastEvent = eventTime - self.timeOfLastEvent
         # print(self.timePassedSinceLastEvent)
-        self.timeOfLastEvent = event.eventTime
+        self.timeOfLastEvent = eventTime
 
         # lastEventServingTime = int(self.serverStatus) * self.timePassedSinceLastEvent
         # print(int(self.serverStatus))
@@ -82,6 +93,11 @@ class States:
         areaToBeAdded = self.peopleInQueue * self.timePassedSinceLastEvent
         self.queueArea += areaToBeAdded
 
+        if self.queueHistogram is not None:
+            busy = sim.params.k - self.serverAvailableRightNow
+            self.queueHistogram.add(self.peopleInQueue, self.timePassedSinceLastEvent)
+            self.systemHistogram.add(self.peopleInQueue + busy, self.timePassedSinceLastEvent)
+
     def finish(self, sim):
         # Complete this function
         if self.totalServed != 0:
@@ -90,10 +106,11 @@ class States:
             self.avgQdelay = 0.0
             print('Average delay could not be calculated as divisor totalServed can not be 0.')
 
-        self.avgQlength = self.queueArea / sim.now()
+        observedTime = sim.now() - self.warmupTime
+        self.avgQlength = self.queueArea / observedTime
 
         # utilization factor
-        self.util = self.totalServingTime / sim.now()
+        self.util = self.totalServingTime / observedTime
 
     def printResults(self, sim):
         # DO NOT CHANGE THESE LINES
@@ -108,125 +125,118 @@ class States:
     def getResults(self, sim):
         return self.avgQlength, self.avgQdelay, self.util
 
+    def getDelayQuantiles(self, qs=(0.5, 0.95, 0.99)):
+        # from the sketch, so approximate; they include any warm-up period
+        if self.delaySketch is None:
+            raise ValueError('Delay quantiles need a States(sketch=True).')
+        return tuple(self.delaySketch.quantiles(qs))
 
-# Write more functions if required
 
+# Write more functions if required
 
-class Event:
-    def __init__(self, sim):
-        self.eventType = None
-        self.sim = sim
-        self.eventTime = None
-
-    def process(self, sim):
-        raise Exception('Unimplemented process method for the event!')
 
-    def __repr__(self):
-        return self.eventType
+# Event handlers, Simulator.run() looks them up by the event kind
+def processStart(sim, eventTime, server):
+    # initiate the first arrival event
+    nextArrivalEventTime = eventTime + sim.variates.arrival(sim.params.lambd)
+    sim.scheduleEvent(ARRIVAL, nextArrivalEventTime)
 
+    if sim.checkpointInterval is not None:
+        sim.scheduleEvent(CHECKPOINT, eventTime + sim.checkpointInterval)
 
-class StartEvent(Event):
-    def __init__(self, eventTime, sim):
-        self.eventTime = eventTime
-        self.eventType = 'START'
-        self.sim = sim
+    # push the exit event too. A sequential run has no fixed horizon and is ended by its observers.
+    if sim.params.timeLimit is not None:
+        sim.scheduleEvent(EXIT, sim.params.timeLimit)
 
-    def process(self, sim):
-        # Complete this function
-        # initiate the first arrival event
-        nextArrivalEventTime = self.eventTime + random.expovariate(sim.params.lambd)
-        sim.scheduleEvent(ArrivalEvent(nextArrivalEventTime, sim))
 
-        # push the exit event too.
-        sim.scheduleEvent(ExitEvent(sim.params.timeLimit, sim))
+def processArrival(sim, eventTime, server):
+    # this customer has not arrived yet. he will come after 'sim.variates.arrival(sim.params.lambd)'
+    # time later than now.
 
+    # Scheduling next arrival before processing current arrival event
+    nextArrivalEventTime = sim.now() + sim.variates.arrival(sim.params.lambd)
+    sim.scheduleEvent(ARRIVAL, nextArrivalEventTime)  # scheduling next arrival event
 
-class ExitEvent(Event):
-    def __init__(self, eventTime, sim):
-        self.eventTime = eventTime
-        self.eventType = 'EXIT'
-        self.sim = sim
+    # process current arrival event now
+    if sim.states.serverAvailableRightNow > 0:  # at least one server is idle
+        # no delay except service delay
+        sim.states.serverAvailableRightNow -= 1
+        currentEventServiceDuration = sim.variates.service(sim.params.mu)
+        currentEventDepartureTime = sim.now() + currentEventServiceDuration
 
-    def process(self, sim):
-        # Complete this function
-        print('This is an EXIT event. Time: ', self.eventTime)
+        sim.states.totalServed += 1
+        sim.states.serverStatus = ServerState.BUSY
 
+        currentEventDelay = 0
+        sim.states.totalDelay += currentEventDelay
+        if sim.states.delaySketch is not None:
+            sim.states.delaySketch.update(currentEventDelay)
 
-class ArrivalEvent(Event):
-    # Write __init__ function
-    def __init__(self, eventTime, sim):
-        super().__init__(sim)
-        self.eventType = 'ARRIVAL'
-        self.sim = sim
-        self.eventTime = eventTime
+        sim.scheduleEvent(DEPARTURE, currentEventDepartureTime)
 
-    def process(self, sim):
-        # Complete this function
-        # this customer has not arrived yet. he will come after 'random.expovariate(sim.params.lambd)'
-        # time later than now.
+    else:  # No server is idle
+        sim.states.peopleInQueue += 1
+        sim.states.queue.append(sim.now())
 
-        # Scheduling next arrival before processing current arrival event
-        nextArrivalEventTime = sim.now() + random.expovariate(sim.params.lambd)
-        sim.scheduleEvent(ArrivalEvent(nextArrivalEventTime, sim))  # scheduling next arrival event
+        # a queue this long means the run is diverging, end it before it takes all the memory
+        if sim.queueCap is not None and sim.states.peopleInQueue >= sim.queueCap and not sim.diverged:
+            sim.diverged = True
+            sim.scheduleEvent(EXIT, eventTime)
 
-        # process current arrival event now
-        if sim.states.serverAvailableRightNow > 0:  # at least one server is idle
-            # no delay except service delay
-            sim.states.serverAvailableRightNow -= 1
-            currentEventServiceDuration = random.expovariate(sim.params.mu)
-            currentEventDepartureTime = sim.now() + currentEventServiceDuration
 
-            sim.states.totalServed += 1
-            sim.states.serverStatus = ServerState.BUSY
+def processDeparture(sim, eventTime, server):
+    if len(sim.states.queue) == 0:
+        sim.states.serverStatus = ServerState.IDLE
+        sim.states.serverAvailableRightNow += 1
+        sim.states.serverAvailableRightNow = min(sim.states.serverAvailableRightNow, sim.params.k)
+    else:
+        nextDepartureEventTime = sim.now() + sim.variates.service(sim.params.mu)
+        sim.scheduleEvent(DEPARTURE, nextDepartureEventTime)
 
-            currentEventDelay = 0
-            sim.states.totalDelay += currentEventDelay
+        currentEventDelay = sim.now() - sim.states.queue[0]
+        sim.states.totalDelay += currentEventDelay
+        if sim.states.delaySketch is not None:
+            sim.states.delaySketch.update(currentEventDelay)
 
-            sim.scheduleEvent(DepartureEvent(currentEventDepartureTime, sim))
+        sim.states.totalServed += 1
 
-        else:  # No server is idle
-            sim.states.peopleInQueue += 1
-            sim.states.queue.append(sim.now())
+        sim.states.peopleInQueue -= 1
+        sim.states.queue.popleft()
 
 
-class DepartureEvent(Event):
-    # Write __init__ function
-    def __init__(self, eventTime, sim):
-        super().__init__(sim)
-        self.sim = sim
-        self.eventTime = eventTime
-        self.eventType = 'DEPARTURE'
+def processCheckpoint(sim, eventTime, server):
+    for observer in sim.observers:
+        observer.observe(sim)
 
-    def process(self, sim):
-        # Complete this function
-        if len(sim.states.queue) == 0:
-            sim.states.serverStatus = ServerState.IDLE
-            sim.states.serverAvailableRightNow += 1
-            sim.states.serverAvailableRightNow = min(sim.states.serverAvailableRightNow, sim.params.k)
-        else:
-            nextDepartureEventTime = sim.now() + random.expovariate(sim.params.mu)
-            sim.scheduleEvent(DepartureEvent(nextDepartureEventTime, sim))
-
-            currentEventDelay = sim.now() - sim.states.queue[0]
-            sim.states.totalDelay += currentEventDelay
-
-            sim.states.totalServed += 1
-
-            sim.states.peopleInQueue -= 1
-            sim.states.queue.pop(0)
+    if sim.stopRequested:
+        sim.scheduleEvent(EXIT, eventTime)
+    else:
+        sim.scheduleEvent(CHECKPOINT, eventTime + sim.checkpointInterval)
 
 
 class Simulator:
-    def __init__(self, seed):
-        self.eventQ = []
+    def __init__(self, seed, blockSize=4096, scheduler='heap', antithetic=None):
+        self.eventQ = makeScheduler(scheduler)  # 'heap', 'calendar' or 'ladder'
+        self.seq = 0  # events scheduled so far, also breaks ties between equal event times
+        self.handlers = (processStart, processArrival, processDeparture, None, processCheckpoint)
         self.simclock = 0
         self.seed = seed
+        self.blockSize = blockSize  # how many variates are generated at once per stream
+        self.antithetic = antithetic  # None, or False/True for the two runs of an antithetic pair
+        self.variates = None
         self.params = None
         self.states = None
+        self.trace = None  # optional Trace.TraceRecorder, filled with one record per event
+
+        self.observers = []  # objects with observe(sim), called at every CHECKPOINT event, and finish(sim)
+        self.checkpointInterval = None  # simulated time between checkpoints, None disables them
+        self.stopRequested = False  # set by an observer to end the run at the current checkpoint
+        self.queueCap = None  # waiting customers at which the run is stopped as diverging, None for no cap
+        self.diverged = False  # set when the queue hit queueCap or Stability.DivergenceDetector fired
 
     def initialize(self):
         self.simclock = 0
-        self.scheduleEvent(StartEvent(0, self))
+        self.scheduleEvent(START, 0)
 
     def configure(self, params, states):
         self.params = params
@@ -237,140 +247,138 @@ class Simulator:
     def now(self):
         return self.simclock
 
-    def scheduleEvent(self, event):
-        heapq.heappush(self.eventQ, (event.eventTime, event))
+    def scheduleEvent(self, kind, eventTime, server=NO_SERVER):
+        self.seq += 1
+        self.eventQ.push((eventTime, self.seq, kind, server))
 
     def run(self):
-        random.seed(self.seed)
+        self.variates = ExpoVariates(self.seed, self.blockSize, self.antithetic)
         self.initialize()
 
+        # the traced loop is separate so that untraced runs do not pay for it
+        if self.trace is not None:
+            self.runTraced()
+        else:
+            self.runEvents()
+
+        self.finish()
+
+    def runEvents(self):
         while len(self.eventQ) > 0:
-            time, event = heapq.heappop(self.eventQ)
+            eventTime, seq, kind, server = self.eventQ.pop()
 
-            if event.eventType == 'EXIT':
+            if kind == EXIT:
                 break
 
             if self.states != None:
-                self.states.update(self, event)
+                self.states.update(self, eventTime)
 
-            # print(event.eventTime, 'Event', event)
-            self.simclock = event.eventTime
-            event.process(self)
+            self.simclock = eventTime
+            self.handlers[kind](self, eventTime, server)
+
+    def runTraced(self):
+        record = self.trace.record
+        while len(self.eventQ) > 0:
+            eventTime, seq, kind, server = self.eventQ.pop()
 
+            if kind == EXIT:
+                break
+
+            if self.states != None:
+                self.states.update(self, eventTime)
+
+            # queue length as seen by the event, before it is processed
+            record(eventTime, kind, server, self.states.peopleInQueue)
+            self.simclock = eventTime
+            self.handlers[kind](self, eventTime, server)
+
+        self.trace.close()
+
+    def finish(self):
+        for observer in self.observers:
+            observer.finish(self)
         self.states.finish(self)
 
     def printResults(self):
         self.states.printResults(self)
+        if self.states.delaySketch is not None:
+            p50, p95, p99 = self.states.getDelayQuantiles()
+            print(f'Queue Delay Quantiles: p50 = {p50}, p95 = {p95}, p99 = {p99}')
+        if self.states.warmupTime > 0:
+            print(f'Warm-up truncated at time {self.states.warmupTime}'
+                  + (', the delay quantiles still include it' if self.states.delaySketch is not None else ''))
+        if self.diverged:
+            print(f'Run diverged and was stopped at time {self.now()}, the averages are lower bounds')
 
     def getResults(self):
         return self.states.getResults(self)
 
-    def print_analytical_results(self):
-        avg_q_len = (self.params.lambd * self.params.lambd) / (self.params.mu * (self.params.mu - self.params.lambd))
-
-        avg_delay_in_q = self.params.lambd / (self.params.mu * (self.params.mu - self.params.lambd))
+    def getControls(self):
+        return self.variates.getControls()
 
-        server_util_factor = self.params.lambd / self.params.mu
+    def print_analytical_results(self):
+        # Erlang C results, valid for any k (they reduce to the M/M/1 formulas for k = 1)
+        avg_q_len, avg_delay_in_q, server_util_factor = analyticResults(self.params.lambd, self.params.mu,
+                                                                         self.params.k)
 
         print("\n################### Analytical Results #######################")
-        print("lambda = %lf, mu = %lf" % (self.params.lambd, self.params.mu))
-        print("Average queue length", round(avg_q_len, 3))
-        print("Average delay in queue", round(avg_delay_in_q, 3))
-        print("Server utilization factor", round(server_util_factor, 3))
+        print("lambda = %lf, mu = %lf, k = %d" % (self.params.lambd, self.params.mu, self.params.k))
+        print("Average queue length", round(float(avg_q_len), 3))
+        print("Average delay in queue", round(float(avg_delay_in_q), 3))
+        print("Server utilization factor", round(float(server_util_factor), 3))
 
 
 def experiment1():
     seed = 101
     sim = Simulator(seed)
-    sim.configure(Params(5.0 / 60, 8.0 / 60, 1), States())
+    sim.configure(Params(5.0 / 60, 8.0 / 60, 1), States(sketch=True))
     sim.run()
     sim.printResults()
     sim.print_analytical_results()
 
 
-def experiment2():
+def experiment2(engine='event', workers=None, replications=1, cache=None, outputDir='figures', formats=('png',)):
     seed = 110
     mu = 1000.0 / 60
     ratios = [u / 10.0 for u in range(1, 11)]
 
-    avglength = []
-    avgdelay = []
-    util = []
+    # every ratio is an independent run, so the sweep is spread over worker processes
+    # k = 1 here, so 'lindley' and 'ctmc' work as well as the event engine
+    paramsList = [Params(mu * ro, mu, 1) for ro in ratios]
+    results, errors = runExperimentSweep(paramsList, seed, engine, workers, replications, cache)
 
-    for ro in ratios:
-        sim = Simulator(seed)
-        sim.configure(Params(mu * ro, mu, 1), States())
-        sim.run()
+    # analytic curves to overlay, computed for the whole sweep at once
+    analytic = analyticResults([mu * ro for ro in ratios], mu, 1)
 
-        length, delay, utl = sim.getResults()
-        avglength.append(length)
-        avgdelay.append(delay)
-        util.append(utl)
+    # written to outputDir with the Agg backend instead of shown in a window
+    figure = sweepFigure('experiment2', ratios, results, 'Ratio (ro)', errors, analytic)
+    return renderFigures([figure], outputDir, formats)
 
-    plt.figure(1)
-    plt.subplot(311)
-    plt.plot(ratios, avglength)
-    plt.xlabel('Ratio (ro)')
-    plt.ylabel('Avg Q length')
 
-    plt.subplot(312)
-    plt.plot(ratios, avgdelay)
-    plt.xlabel('Ratio (ro)')
-    plt.ylabel('Avg Q delay (sec)')
-
-    plt.subplot(313)
-    plt.plot(ratios, util)
-    plt.xlabel('Ratio (ro)')
-    plt.ylabel('Util')
-
-    plt.show()
-
-
-def experiment3():
+def experiment3(engine='event', workers=None, replications=1, cache=None, crn=False, outputDir='figures',
+                formats=('png',)):
     server_quantity = 4
     lambd = 5.0 / 60
     mu = 8.0 / 60
     seed = 101
 
-    avg_length = []
-    avg_delay = []
-    util = []
-
     servers = []
     for i in range(1, server_quantity + 1):
         servers.append(i)
 
-    for i in range(1, server_quantity + 1):
-        sim = Simulator(seed)
-        sim.configure(Params(lambd, mu, i), States())
-
-        sim.run()
-        sim.printResults()
-        sim.print_analytical_results()
-
-        length, delay, utl = sim.getResults()
-        avg_length.append(length)
-        avg_delay.append(delay)
-        util.append(utl)
-
-    # plot
-    plt.figure(1)
-    plt.subplot(311)
-    plt.plot(servers, avg_length)
-    plt.xlabel('Server (k)')
-    plt.ylabel('Avg Q length')
-
-    plt.subplot(312)
-    plt.plot(servers, avg_delay)
-    plt.xlabel('Server (k)')
-    plt.ylabel('Avg Q delay (sec)')
-
-    plt.subplot(313)
-    plt.plot(servers, util)
-    plt.xlabel('Server (k)')
-    plt.ylabel('Util')
-
-    plt.show()
+    # 'ctmc' advances the birth-death chain directly and costs O(1) per event for any k
+    paramsList = [Params(lambd, mu, i) for i in servers]
+    results, errors = runExperimentSweep(paramsList, seed, engine, workers, replications, cache, crn)
+
+    for i, (length, delay, utl) in zip(servers, results):
+        print(f'k = {i}: Average Queue Length: {length}, Average Queue Delay: {delay}, Server Utilization Factor: {utl}')
+
+    # analytic curves to overlay, computed for the whole sweep at once
+    analytic = analyticResults(lambd, mu, servers)
+
+    # written to outputDir with the Agg backend instead of shown in a window
+    figure = sweepFigure('experiment3', servers, results, 'Server (k)', errors, analytic)
+    return renderFigures([figure], outputDir, formats)
 
 
 def main():
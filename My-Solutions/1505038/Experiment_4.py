@@ -10,9 +10,15 @@ For the sake of comparison, while plotting results from simulation, also produce
 
 import enum
 import heapq
-import random
 
-import matplotlib.pyplot as plt
+from Events import START, ARRIVAL, DEPARTURE, EXIT, NO_SERVER
+from MultiQueue import MultiQueue
+from Replication import runExperimentSweep
+from Reporting import renderFigures, sweepFigure
+from Scheduler import makeScheduler
+from Histogram import TimeHistogram
+from Sketch import KllSketch
+from Variates import ExpoVariates
 
 
 # Using enum class create enumerations
@@ -39,11 +45,12 @@ IDLE = -1
 
 
 class States:
-    def __init__(self):
+    def __init__(self, sketch=False, histograms=False):
         # States
-        self.queue = []  # just stores the arrival times
+        self.queue = []  # (arrival time, service requirement or None) of every waiting customer
         # Declare other states variables that might be needed
         self.totalDelay = 0.0
+        self.delaySketch = KllSketch() if sketch else None  # every customer's delay, for the delay quantiles
         self.totalServed = 0
         # Statistics
         self.util = 0.0
@@ -53,38 +60,38 @@ class States:
         self.totalServingTime = 0.0
 
         self.multiServerStatus = []  # multiple server
+        self.idleServers = []  # ids of the idle servers, a min-heap
 
         self.timeOfLastEvent = 0.0
         self.timePassedSinceLastEvent = 0.0
 
         self.queueArea = 0.0
+        self.queueHistogram = TimeHistogram() if histograms else None  # time spent with n customers waiting, over all the queues
+        self.systemHistogram = TimeHistogram() if histograms else None  # time spent with n customers in the system
 
         # My added variables
         self.serverUtilizationFactor = 0.0
         self.serverStatus = ServerState.IDLE
-        self.peopleInQueue = 0
+        self.peopleInQueue = 0  # running total over all the queues, kept up to date by the event handlers
+        self.busyServers = 0  # running total, kept up to date by the event handlers
 
         self.serverAvailableRightNow = 0
 
-    def update(self, sim, event):
+    def update(self, sim, eventTime):
         # Complete this function
-        self.timePassedSinceLastEvent = event.eventTime - self.timeOfLastEvent
+        self.timePassedSinceLastEvent = eventTime - self.timeOfLastEvent
         # print(self.timePassedSinceLastEvent)
-        self.timeOfLastEvent = event.eventTime
-
-        # summation of all server's people number
-        self.peopleInQueue = sum([len(self.queue[i])
-                                  for i in range(sim.params.k)])
-        # print(self.queue)
+        self.timeOfLastEvent = eventTime
 
+        # peopleInQueue and busyServers are running totals, so this is O(1) whatever k is
         self.queueArea += (self.peopleInQueue *
                            self.timePassedSinceLastEvent) / sim.params.k
 
-        # counting busy server
-        busyServers = len([i for i in range(sim.params.k)
-                           if self.multiServerStatus[i] != IDLE])
+        self.totalServingTime += self.timePassedSinceLastEvent * self.busyServers / sim.params.k
 
-        self.totalServingTime += self.timePassedSinceLastEvent * busyServers / sim.params.k
+        if self.queueHistogram is not None:
+            self.queueHistogram.add(self.peopleInQueue, self.timePassedSinceLastEvent)
+            self.systemHistogram.add(self.peopleInQueue + self.busyServers, self.timePassedSinceLastEvent)
 
     def finish(self, sim):
         # Complete this function
@@ -114,191 +121,157 @@ class States:
     def getResults(self, sim):
         return self.avgQlength, self.avgQdelay, self.util
 
+    def getDelayQuantiles(self, qs=(0.5, 0.95, 0.99)):
+        # from the sketch, so approximate; they include any warm-up period
+        if self.delaySketch is None:
+            raise ValueError('Delay quantiles need a States(sketch=True).')
+        return tuple(self.delaySketch.quantiles(qs))
 
-# Write more functions if required
 
+# Write more functions if required
 
-class Event:
-    def __init__(self, sim):
-        self.eventType = None
-        self.sim = sim
-        self.eventTime = None
 
-    def process(self, sim):
-        raise Exception('Unimplemented process method for the event!')
+# Event handlers, Simulator.run() looks them up by the event kind
+def processStart(sim, eventTime, server):
+    # initiate the first arrival event
+    nextArrivalEventTime = eventTime + \
+        sim.variates.arrival(sim.params.lambd)
+    sim.scheduleEvent(ARRIVAL, nextArrivalEventTime)
 
-    def __repr__(self):
-        return self.eventType
+    # push the exit event too.
+    sim.scheduleEvent(EXIT, sim.params.timeLimit)
 
 
-class StartEvent(Event):
-    def __init__(self, eventTime, sim):
-        self.eventTime = eventTime
-        self.eventType = 'START'
-        self.sim = sim
+def processArrival(sim, eventTime, server):
+    # this customer has not arrived yet. he will come after 'sim.variates.arrival(sim.params.lambd)'
+    # time later than now.
 
-    def process(self, sim):
-        # Complete this function
-        # initiate the first arrival event
-        nextArrivalEventTime = self.eventTime + \
-            random.expovariate(sim.params.lambd)
-        sim.scheduleEvent(ArrivalEvent(nextArrivalEventTime, sim))
+    # Scheduling next arrival before processing current arrival event
+    ##################################
+    nextArrivalEventTime = sim.now() + sim.variates.arrival(sim.params.lambd)
+    # scheduling next arrival event
+    sim.scheduleEvent(ARRIVAL, nextArrivalEventTime)
 
-        # push the exit event too.
-        sim.scheduleEvent(ExitEvent(sim.params.timeLimit, sim))
+    # with common random numbers the service requirement is drawn on arrival and goes with
+    # the customer, so customer n gets the n-th service draw whichever queue it ends up in
+    serviceDuration = sim.variates.service(sim.params.mu) if sim.crn else None
 
+    if sim.states.idleServers:
+        # the idle server with the smallest id, i.e. the first idle one from the left
+        i = heapq.heappop(sim.states.idleServers)
 
-class ExitEvent(Event):
-    def __init__(self, eventTime, sim):
-        self.eventTime = eventTime
-        self.eventType = 'EXIT'
-        self.sim = sim
+        if serviceDuration is None:
+            serviceDuration = sim.variates.service(sim.params.mu)
+        currentEventServiceDuration = serviceDuration
+        currentEventDepartureTime = sim.now() + currentEventServiceDuration
 
-    def process(self, sim):
-        # Complete this function
-        print('This is an EXIT event. Time: ', self.eventTime)
-
-
-class ArrivalEvent(Event):
-    # Write __init__ function
-    def __init__(self, eventTime, sim):
-        super().__init__(sim)
-        self.eventType = 'ARRIVAL'
-        self.sim = sim
-        self.eventTime = eventTime
-
-    def process(self, sim):
-        def debug():
-            x = str(sim.states.totalServed) + ', ' + str(sim.states.totalDelay)
-            print('Debug Log:')
-            print(x)
-            print(sim.states.totalServed)
-            print(sim.states.totalDelay)
-            print(sim.states.totalServingTime)
-            print(sim.states.avgQlength)
-            print(sim.states.avgQdelay)
-            print(sim.states.timePassedSinceLastEvent)
+        # the departure carries the server id, so nothing has to be searched for when it happens
+        sim.scheduleEvent(DEPARTURE, currentEventDepartureTime, i)
 
-        # Complete this function
-        # this customer has not arrived yet. he will come after 'random.expovariate(sim.params.lambd)'
-        # time later than now.
+        # make the server busy.
+        # Assign departure time instead of enum
+        sim.states.multiServerStatus[i] = currentEventDepartureTime
+        sim.states.busyServers += 1
+        sim.states.totalServed += 1
 
-        # Scheduling next arrival before processing current arrival event
-        ##################################
-        nextArrivalEventTime = sim.now() + random.expovariate(sim.params.lambd)
-        # scheduling next arrival event
-        sim.scheduleEvent(ArrivalEvent(nextArrivalEventTime, sim))
+        currentEventDelay = 0
+        sim.states.totalDelay += currentEventDelay
+        if sim.states.delaySketch is not None:
+            sim.states.delaySketch.update(currentEventDelay)
 
-        for i in range(sim.params.k):
-            if sim.states.multiServerStatus[i] == IDLE:
+        return
 
-                currentEventServiceDuration = random.expovariate(sim.params.mu)
-                currentEventDepartureTime = sim.now() + currentEventServiceDuration
+    # ***no idle server was found, so push the new arrival even in
+    # the smallest queue from the left.
 
-                sim.scheduleEvent(DepartureEvent(
-                    currentEventDepartureTime, sim))
+    # index of the minimum length queue, O(log k) through the length index
+    minLenIdx = sim.states.queue.shortest()
 
-                # make the server busy.
-                # Assign departure time instead of enum
-                # to track which server got free and from which queue we will serve
-                sim.states.multiServerStatus[i] = currentEventDepartureTime
-                sim.states.totalServed += 1
+    sim.states.queue.append(minLenIdx, (eventTime, serviceDuration))
+    sim.states.peopleInQueue += 1
 
-                currentEventDelay = 0
-                sim.states.totalDelay += currentEventDelay
+    #################################
 
-                return
 
-        # ***no idle server was found, so push the new arrival even in
-        # the smallest queue from the left.
+def balanceQueue(idx, sim):
+    queue = sim.states.queue
 
-        # minimum length of queue and the index of the minimum length queue
-        minLen, minLenIdx = min([(len(sim.states.queue[i]), i)
-                                 for i in range(sim.params.k)], key=lambda tuple: tuple[0])
+    # left queue is valid and length is not 0
+    if idx - 1 >= 0 and queue.length(idx - 1):
+        while queue.length(idx - 1) - queue.length(idx) >= 2:
+            toMove = queue.pop(idx - 1)
+            queue.append(idx, toMove)
 
-        sim.states.queue[minLenIdx].append(self.eventTime)
+        # right queue is valid and length not 0
+    if idx + 1 < sim.params.k and queue.length(idx + 1):
+        while queue.length(idx + 1) - queue.length(idx) >= 2:
+            toMove = queue.pop(idx + 1)
+            queue.append(idx, toMove)
 
-        #################################
+    return sim
 
 
-class DepartureEvent(Event):
-    # Write __init__ function
-    def __init__(self, eventTime, sim):
-        super().__init__(sim)
-        self.sim = sim
-        self.eventTime = eventTime
-        self.eventType = 'DEPARTURE'
+def serveNext(sim, eventTime, idx):
+    # server idx is idle and its queue is not empty: serve the head of its queue
+    t, serviceDuration = sim.states.queue.popleft(idx)
+    sim.states.peopleInQueue -= 1
+    sim.states.totalDelay += eventTime - t
+    if sim.states.delaySketch is not None:
+        sim.states.delaySketch.update(eventTime - t)
 
-    def balanceQueue(self, idx, sim):
-        # left queue is valid and length is not 0
-        if idx - 1 >= 0 and len(sim.states.queue[idx - 1]):
-            while len(sim.states.queue[idx - 1]) - len(sim.states.queue[idx]) >= 2:
-                toMove = sim.states.queue[idx - 1].pop()
-                sim.states.queue[idx].append(toMove)
+    if serviceDuration is None:
+        serviceDuration = sim.variates.service(sim.params.mu)
 
-            # right queue is valid and length not 0
-        if idx + 1 < sim.params.k and len(sim.states.queue[idx + 1]):
-            while len(sim.states.queue[idx + 1]) - len(sim.states.queue[idx]) >= 2:
-                toMove = sim.states.queue[idx + 1].pop()
-                sim.states.queue[idx].append(toMove)
+    # schedule a departure
+    departureTime = sim.now() + serviceDuration
+    sim.scheduleEvent(DEPARTURE, departureTime, idx)
 
-        return sim
+    # make the server busy
+    sim.states.multiServerStatus[idx] = departureTime
+    sim.states.busyServers += 1
+    sim.states.totalServed += 1
 
-    def process(self, sim):
-        # Complete this function
-        idx = -1
-        for i in range(sim.params.k):
-            # busy with this event itself
-            if self.eventTime == sim.states.multiServerStatus[i]:
-                sim.states.multiServerStatus[i] = IDLE
-                idx = i
-
-                if len(sim.states.queue[i]):
-                    tem = sim.states.queue[i].pop(0)
-                    sim.states.totalDelay += self.eventTime - tem
-
-                    nextDepartureTime = sim.now() + random.expovariate(sim.params.mu)
-                    sim.scheduleEvent(DepartureEvent(nextDepartureTime, sim))
-
-                    # make the server busy. here we assign the departure time so that we
-                    # can track which server got free and from which queue we will serve
-                    sim.states.multiServerStatus[i] = nextDepartureTime
-                    sim.states.totalServed += 1
-                break
 
-        if idx != -1:
-            # each queue difference will be maximum 2 length
-            sim = self.balanceQueue(idx, sim)
+def processDeparture(sim, eventTime, server):
+    # the server that got free comes with the event
+    idx = server
+    sim.states.multiServerStatus[idx] = IDLE
+    sim.states.busyServers -= 1
 
-            # check if you can serve after q change
-        for i in range(sim.params.k):
-            if sim.states.multiServerStatus[i] == IDLE:
-                # check if there is someone in the q
-                if len(sim.states.queue[i]):
-                    t = sim.states.queue[i].pop(0)
-                    sim.states.totalDelay += self.eventTime - t
+    if sim.states.queue.length(idx):
+        serveNext(sim, eventTime, idx)
 
-                    # schedule a departure
-                    departureTime = sim.now() + random.expovariate(sim.params.mu)
-                    sim.scheduleEvent(DepartureEvent(departureTime, sim))
+    # each queue difference will be maximum 2 length
+    sim = balanceQueue(idx, sim)
 
-                    # make the server busy. here we assign the departure time so that we
-                    # can track which server got free and from which queue we will serve
-                    sim.states.multiServerStatus[i] = departureTime
-                    sim.states.totalServed += 1
+    # check if you can serve after q change. customers only ever join the queue of a
+    # busy server, or this one's by balancing, so this is the only server to check
+    if sim.states.multiServerStatus[idx] == IDLE:
+        # check if there is someone in the q
+        if sim.states.queue.length(idx):
+            serveNext(sim, eventTime, idx)
+        else:
+            heapq.heappush(sim.states.idleServers, idx)
 
 
 class Simulator:
-    def __init__(self, seed):
-        self.eventQ = []
+    def __init__(self, seed, blockSize=4096, scheduler='heap', crn=False, antithetic=None):
+        self.eventQ = makeScheduler(scheduler)  # 'heap', 'calendar' or 'ladder'
+        self.seq = 0  # events scheduled so far, also breaks ties between equal event times
+        self.handlers = (processStart, processArrival, processDeparture)
         self.simclock = 0
         self.seed = seed
+        self.blockSize = blockSize  # how many variates are generated at once per stream
+        self.antithetic = antithetic  # None, or False/True for the two runs of an antithetic pair
+        self.variates = None
         self.params = None
         self.states = None
+        self.trace = None  # optional Trace.TraceRecorder, filled with one record per event
+        self.crn = crn  # common random numbers: draw each service requirement on arrival
 
     def initialize(self):
         self.simclock = 0
-        self.scheduleEvent(StartEvent(0, self))
+        self.scheduleEvent(START, 0)
 
     def configure(self, params, states):
         self.params = params
@@ -306,42 +279,75 @@ class Simulator:
 
         self.states.serverAvailableRightNow = params.k
         self.states.multiServerStatus = [IDLE] * params.k
+        self.states.idleServers = list(range(params.k))  # min-heap of idle server ids
 
-        self.states.queue = []
-        for i in range(self.params.k):
-            self.states.queue.append([])
+        self.states.queue = MultiQueue(params.k)  # one queue per server
 
     def now(self):
         return self.simclock
 
-    def scheduleEvent(self, event):
-        heapq.heappush(self.eventQ, (event.eventTime, event))
+    def scheduleEvent(self, kind, eventTime, server=NO_SERVER):
+        self.seq += 1
+        self.eventQ.push((eventTime, self.seq, kind, server))
 
     def run(self):
-        random.seed(self.seed)
+        self.variates = ExpoVariates(self.seed, self.blockSize, self.antithetic)
         self.initialize()
 
+        # the traced loop is separate so that untraced runs do not pay for it
+        if self.trace is not None:
+            self.runTraced()
+        else:
+            self.runEvents()
+
+        self.finish()
+
+    def runEvents(self):
         while len(self.eventQ) > 0:
-            time, event = heapq.heappop(self.eventQ)
+            eventTime, seq, kind, server = self.eventQ.pop()
 
-            if event.eventType == 'EXIT':
+            if kind == EXIT:
                 break
 
             if self.states != None:
-                self.states.update(self, event)
+                self.states.update(self, eventTime)
 
-            # print(event.eventTime, 'Event', event)
-            self.simclock = event.eventTime
-            event.process(self)
+            self.simclock = eventTime
+            self.handlers[kind](self, eventTime, server)
 
+    def runTraced(self):
+        record = self.trace.record
+        while len(self.eventQ) > 0:
+            eventTime, seq, kind, server = self.eventQ.pop()
+
+            if kind == EXIT:
+                break
+
+            if self.states != None:
+                self.states.update(self, eventTime)
+
+            # queue length as seen by the event, before it is processed
+            record(eventTime, kind, server, self.states.peopleInQueue)
+            self.simclock = eventTime
+            self.handlers[kind](self, eventTime, server)
+
+        self.trace.close()
+
+    def finish(self):
         self.states.finish(self)
 
     def printResults(self):
         self.states.printResults(self)
+        if self.states.delaySketch is not None:
+            p50, p95, p99 = self.states.getDelayQuantiles()
+            print(f'Queue Delay Quantiles: p50 = {p50}, p95 = {p95}, p99 = {p99}')
 
     def getResults(self):
         return self.states.getResults(self)
 
+    def getControls(self):
+        return self.variates.getControls()
+
     def print_analytical_results(self):
         avg_q_len = (self.params.lambd * self.params.lambd) / \
             (self.params.mu * (self.params.mu - self.params.lambd))
@@ -358,49 +364,23 @@ class Simulator:
         print("Server utilization factor", round(server_util_factor, 3))
 
 
-def experiment4():
+def experiment4(workers=None, replications=1, cache=None, crn=False, outputDir='figures', formats=('png',)):
     seed = 101
     lambd = 5.0 / 60
     mu = 8.0 / 60
     server_quantity = 4
 
-    avg_length = []
-    avg_delay = []
-    util = []
-
     servers = [i for i in range(1, server_quantity + 1, 1)]
 
-    for i in range(1, server_quantity + 1, 1):
-        sim = Simulator(seed)
-        sim.configure(Params(lambd, mu, i), States())
-
-        sim.run()
-        sim.printResults()
-        # sim.print_analytical_results()
-
-        length, delay, utl = sim.getResults()
-        avg_length.append(length)
-        avg_delay.append(delay)
-        util.append(utl)
-
-    # plot
-    plt.figure(1)
-    plt.subplot(311)
-    plt.plot(servers, avg_length)
-    plt.xlabel('Server (k)')
-    plt.ylabel('Avg Q length')
-
-    plt.subplot(312)
-    plt.plot(servers, avg_delay)
-    plt.xlabel('Server (k)')
-    plt.ylabel('Avg Q delay (sec)')
-
-    plt.subplot(313)
-    plt.plot(servers, util)
-    plt.xlabel('Server (k)')
-    plt.ylabel('Util')
-
-    plt.show()
+    paramsList = [Params(lambd, mu, i) for i in servers]
+    results, errors = runExperimentSweep(paramsList, seed, 'multiqueue', workers, replications, cache, crn)
+
+    for i, (length, delay, utl) in zip(servers, results):
+        print(f'k = {i}: Average Queue Length: {length}, Average Queue Delay: {delay}, Server Utilization Factor: {utl}')
+
+    # written to outputDir with the Agg backend instead of shown in a window
+    figure = sweepFigure('experiment4', servers, results, 'Server (k)', errors)
+    return renderFigures([figure], outputDir, formats)
 
 
 def main():
@@ -0,0 +1,52 @@
+"""
+Time-weighted histograms of the number of customers.
+States.update() already knows how long the system stayed in its current state, so adding
+that duration to the bucket of the current count gives the whole distribution at O(1) per
+event instead of only the mean. Bucket n holds the time spent with exactly n customers and
+the last bucket the time spent with size or more (the overflow). probabilities() divided by
+the total time is the empirical P(N = n), to be compared with Analytic.systemDistribution()
+and Analytic.queueDistribution(), which use the same layout. With Warmup.MserWarmup attached
+the histograms are truncated with the other accumulators and cover the same steady-state
+window as the means; otherwise they cover the whole run. A States only keeps them when
+built with States(histograms=True), so runs that only need the means do not pay two extra
+updates per event.
+"""
+
+import numpy as np
+
+
+class TimeHistogram:
+    def __init__(self, size=256):
+        self.size = size
+        self.weights = [0.0] * (size + 1)  # a plain list is the fastest to update from Python
+
+    def add(self, n, duration):
+        self.weights[n if n < self.size else self.size] += duration
+
+    def addSteps(self, times, deltas, endTime):
+        # vectorized: the count starts at 0 and changes by deltas[i] at times[i] (sorted), up to endTime
+        times = np.asarray(times, dtype=float)
+        keep = times < endTime
+        times = times[keep]
+        counts = np.concatenate(([0], np.cumsum(np.asarray(deltas, dtype=int)[keep])))
+        durations = np.diff(np.concatenate(([0.0], times, [endTime])))
+        buckets = np.bincount(np.minimum(counts, self.size), weights=durations, minlength=self.size + 1)
+        self.weights = (np.asarray(self.weights) + buckets).tolist()
+
+    def merge(self, other):
+        if other.size != self.size:
+            raise ValueError('Only histograms with the same size can be merged.')
+        self.weights = [a + b for a, b in zip(self.weights, other.weights)]
+
+    def toArray(self):
+        # time spent at 0, 1, ..., size - 1 customers and at size or more
+        return np.array(self.weights)
+
+    def probabilities(self):
+        weights = self.toArray()
+        total = weights.sum()
+        return weights / total if total > 0 else weights
+
+    def mean(self):
+        # mean over the non-overflow buckets, the time average of n if nothing overflowed
+        return float(np.dot(np.arange(self.size), self.probabilities()[:-1]))
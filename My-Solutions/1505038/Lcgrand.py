@@ -0,0 +1,96 @@
+"""
+NumPy port of the reference generator in Given_Codes/C-Code/lcgrand.c.
+The C generator is the prime modulus multiplicative LCG Z(i) = 630360016 Z(i-1) mod (2^31 - 1)
+with 100 streams whose default seeds are spaced 100,000 apart, returning the float
+(Z >> 7 | 1) / 2^24. Stepping one value at a time is a Python level loop, so here a whole
+block of a stream is produced at once: with the jump-ahead multipliers a^j mod m for
+j = 1 .. blockSize, Z(i + j) = a^j Z(i) mod m is one vectorized product (below 2^62, exact in
+int64). The uniforms are float32 like the C float, and bit for bit the ones lcgrand() returns.
+"""
+
+import numpy as np
+
+
+MODLUS = 2147483647
+MULT = 630360016  # MULT1 * MULT2 = 24112 * 26143 of the C code
+
+# default seeds of the 100 streams, stream 0 unused by the C code but kept so indices match
+DEFAULT_SEEDS = (
+    1,
+    1973272912, 281629770, 20006270, 1280689831, 2096730329, 1933576050,
+    913566091, 246780520, 1363774876, 604901985, 1511192140, 1259851944,
+    824064364, 150493284, 242708531, 75253171, 1964472944, 1202299975,
+    233217322, 1911216000, 726370533, 403498145, 993232223, 1103205531,
+    762430696, 1922803170, 1385516923, 76271663, 413682397, 726466604,
+    336157058, 1432650381, 1120463904, 595778810, 877722890, 1046574445,
+    68911991, 2088367019, 748545416, 622401386, 2122378830, 640690903,
+    1774806513, 2132545692, 2079249579, 78130110, 852776735, 1187867272,
+    1351423507, 1645973084, 1997049139, 922510944, 2045512870, 898585771,
+    243649545, 1004818771, 773686062, 403188473, 372279877, 1901633463,
+    498067494, 2087759558, 493157915, 597104727, 1530940798, 1814496276,
+    536444882, 1663153658, 855503735, 67784357, 1432404475, 619691088,
+    119025595, 880802310, 176192644, 1116780070, 277854671, 1366580350,
+    1142483975, 2026948561, 1053920743, 786262391, 1792203830, 1494667770,
+    1923011392, 1433700034, 1244184613, 1147297105, 539712780, 1545929719,
+    190641742, 1645390429, 264907697, 620389253, 1502074852, 927711160,
+    364849192, 2049576050, 638580085, 547070247,
+)
+
+
+def jumpMultipliers(count):
+    # a^1 .. a^count mod m, as int64
+    powers = np.empty(count, dtype=np.int64)
+    power = 1
+    for j in range(count):
+        power = power * MULT % MODLUS
+        powers[j] = power
+    return powers
+
+
+def toUniform(z):
+    # the float conversion of lcgrand(): (Z >> 7 | 1) / 2^24, exact in float32
+    return ((z >> 7) | 1).astype(np.float32) / np.float32(16777216.0)
+
+
+class Lcgrand:
+    def __init__(self, seeds=DEFAULT_SEEDS, blockSize=4096):
+        self.zrng = list(seeds)
+        self.blockSize = blockSize
+        self.multipliers = jumpMultipliers(blockSize)
+        self.buffers = {}  # stream -> (block of uniforms, index of the next one)
+
+    def block(self, stream, size=None):
+        # the next size uniforms of stream, as a float32 array
+        if size is None:
+            size = self.blockSize
+        if size > len(self.multipliers):
+            self.multipliers = jumpMultipliers(size)
+        if stream in self.buffers:
+            # continue after the last value lcgrand() handed out, not after its buffered block
+            self.zrng[stream] = self.lcgrandgt(stream)
+            del self.buffers[stream]
+
+        z = (self.multipliers[:size] * self.zrng[stream]) % MODLUS
+        if size:
+            self.zrng[stream] = int(z[-1])
+        return toUniform(z)
+
+    def lcgrand(self, stream):
+        # one uniform at a time like the C function, served from a buffered block
+        values, index = self.buffers.pop(stream, ((), 0))
+        if index == len(values):
+            values, index = self.block(stream), 0
+        self.buffers[stream] = (values, index + 1)
+        return values[index]
+
+    def lcgrandst(self, zset, stream):
+        self.zrng[stream] = zset
+        self.buffers.pop(stream, None)
+
+    def lcgrandgt(self, stream):
+        # the most recently used integer of stream, as the C function returns it
+        if stream not in self.buffers:
+            return self.zrng[stream]
+        # zrng is ahead by the unused part of the buffered block
+        values, index = self.buffers[stream]
+        return self.zrng[stream] * pow(MULT, -(len(values) - index), MODLUS) % MODLUS
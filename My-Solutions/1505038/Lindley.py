@@ -0,0 +1,121 @@
+"""
+Vectorized engine for the single server (M/M/1) case.
+Instead of popping arrival and departure events one at a time, all interarrival and
+service times are drawn up front as NumPy arrays and the waiting times come out of the
+Lindley recursion W(n) = max(0, W(n-1) + S(n-1) - X(n)) evaluated in bulk.
+The statistics are written into the same States object the event simulator uses, so
+getResults() returns the same (avgQlength, avgQdelay, util) tuple.
+"""
+
+import numpy as np
+
+from Analytic import analyticResults
+from Variates import exponentials, makeStreams
+
+
+class LindleySimulator:
+    def __init__(self, seed, blockSize=65536, antithetic=None):
+        self.simclock = 0
+        self.seed = seed
+        self.blockSize = blockSize  # how many interarrival times are drawn at once
+        self.antithetic = antithetic  # None, or False/True for the two runs of an antithetic pair
+        self.params = None
+        self.states = None
+        self.controls = (0.0, 0.0)  # see Variates.ExpoVariates.getControls()
+
+    def configure(self, params, states):
+        if params.k != 1:
+            raise ValueError('The Lindley engine only simulates a single server (k = 1).')
+
+        self.params = params
+        self.states = states
+
+    def now(self):
+        return self.simclock
+
+    def drawArrivals(self, rng):
+        # keep drawing blocks of interarrival times until the time limit is passed
+        blocks = []
+        lastArrival = 0.0
+        while lastArrival < self.params.timeLimit:
+            gaps = exponentials(rng, self.blockSize, self.antithetic) / self.params.lambd
+            gaps[0] += lastArrival
+            block = np.cumsum(gaps)
+            blocks.append(block)
+            lastArrival = block[-1]
+
+        arrivals = np.concatenate(blocks)
+        # only the arrivals before the EXIT event are ever processed
+        return arrivals[:np.searchsorted(arrivals, self.params.timeLimit)]
+
+    def run(self):
+        # same arrival and service streams as ExpoVariates, so both engines see the same sample path
+        arrivalRng, serviceRng = makeStreams(self.seed)
+
+        arrivals = self.drawArrivals(arrivalRng)
+        services = exponentials(serviceRng, len(arrivals), self.antithetic) / self.params.mu
+
+        # Lindley recursion in closed form: with U(n) = S(n-1) - X(n) and P the running
+        # sum of U (P(0) = 0), the delay of customer n is P(n) - min(P(0), ..., P(n)).
+        steps = services[:-1] - np.diff(arrivals)
+        partialSums = np.concatenate(([0.0], np.cumsum(steps)))
+        delays = partialSums - np.minimum.accumulate(partialSums)
+
+        serviceStarts = arrivals + delays
+        departures = serviceStarts + services
+
+        # the event simulator stops at the last event before the time limit
+        timeLimit = self.params.timeLimit
+        departuresBefore = departures[:np.searchsorted(departures, timeLimit)]
+        endTime = 0.0
+        if len(arrivals):
+            endTime = float(arrivals[-1])
+        if len(departuresBefore):
+            endTime = max(endTime, float(departuresBefore[-1]))
+
+        # customers are counted as served when their service starts
+        served = int(np.searchsorted(serviceStarts, timeLimit))
+
+        self.states.totalServed = served
+        self.states.totalDelay = float(np.sum(delays[:served]))
+        if self.states.delaySketch is not None:
+            self.states.delaySketch.extend(delays[:served].tolist())
+        self.states.queueArea = float(np.sum(np.minimum(serviceStarts, endTime) - arrivals))
+        self.states.totalServingTime = float(np.sum(np.clip(np.minimum(departures, endTime) - serviceStarts, 0.0, None)))
+        self.states.timeOfLastEvent = endTime
+
+        if self.states.queueHistogram is not None:
+            # number waiting changes at arrivals and service starts, number in system at arrivals and departures
+            ones = np.ones(len(arrivals), dtype=int)
+            for histogram, leaving in ((self.states.queueHistogram, serviceStarts),
+                                       (self.states.systemHistogram, departures)):
+                times = np.concatenate((arrivals, leaving))
+                order = np.argsort(times, kind='stable')
+                histogram.addSteps(times[order], np.concatenate((ones, -ones))[order], endTime)
+
+        # the arrival times are the running sum of the interarrival times
+        if len(arrivals):
+            self.controls = (float(arrivals[-1]) * self.params.lambd / len(arrivals) - 1.0,
+                             float(np.mean(services)) * self.params.mu - 1.0)
+
+        self.simclock = endTime
+        self.states.finish(self)
+
+    def printResults(self):
+        self.states.printResults(self)
+
+    def getResults(self):
+        return self.states.getResults(self)
+
+    def getControls(self):
+        return self.controls
+
+    def print_analytical_results(self):
+        # M/M/1 formulas, the same block the event simulators print
+        avg_q_len, avg_delay_in_q, server_util_factor = analyticResults(self.params.lambd, self.params.mu, 1)
+
+        print("\n################### Analytical Results #######################")
+        print("lambda = %lf, mu = %lf" % (self.params.lambd, self.params.mu))
+        print("Average queue length", round(float(avg_q_len), 3))
+        print("Average delay in queue", round(float(avg_delay_in_q), 3))
+        print("Server utilization factor", round(float(server_util_factor), 3))
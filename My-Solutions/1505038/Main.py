@@ -0,0 +1,214 @@
+#!/home/heisenberg/anaconda3/bin/python
+
+"""
+Command line entry point for config-driven sweeps.
+A sweep spec is a JSON or TOML file; every key is optional except the load axis:
+
+    name = "mm1"                  # prefix of the figure files
+    engine = "event"              # see Sweep.ENGINES
+    mu = 16.666666666666668
+    rho = [0.1, 0.2, 0.3]         # or lambd = [...]; with rho, lambd = rho * k * mu
+    k = [1, 2]                    # rho, lambd and k also take a single value
+    timeLimit = 10000
+    seed = 110                    # base seed, the replications get seeds spawned from it
+    replications = 1
+    seeds = [110, 111, 112]       # instead of seed and replications: one replication per seed
+    workers = 4
+    crn = false                   # also: antithetic, controls, unstable, heavyTraffic
+    formats = ["png", "svg"]
+
+Every (k, load) pair of the grid is simulated, the results are written to results.json and
+results.csv in the output directory (a skipped unstable point's inf is null in the JSON),
+and one figure per k over the load axis (or one over k when there is a single load) is
+rendered there as well.
+
+    python Main.py sweep.toml -o out --workers 8
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import tomllib
+
+from Analytic import analyticResults
+from Cache import DEFAULT_PATH, ResultCache
+from Replication import METRICS, runReplicatedSweep
+from Reporting import renderFigures, sweepFigure
+from Sweep import ENGINES, runSweep
+
+
+DEFAULTS = {
+    'name': 'sweep',
+    'engine': 'event',
+    'mu': 1.0,
+    'k': [1],
+    'timeLimit': 10000,
+    'seed': 101,
+    'seeds': None,
+    'replications': 1,
+    'workers': None,
+    'confidence': 0.95,
+    'crn': False,
+    'antithetic': False,
+    'controls': False,
+    'unstable': 'flag',
+    'heavyTraffic': None,
+    'cache': False,
+    'formats': ['png'],
+}
+
+
+def loadSpec(path):
+    # the file extension decides the format; .toml or anything else read as JSON
+    with open(path, 'rb') as f:
+        if path.endswith('.toml'):
+            spec = tomllib.load(f)
+        else:
+            spec = json.load(f)
+
+    unknown = set(spec) - set(DEFAULTS) - {'rho', 'lambd'}
+    if unknown:
+        raise ValueError(f'Unknown keys in the sweep spec: {sorted(unknown)}')
+    if ('rho' in spec) == ('lambd' in spec):
+        raise ValueError("The sweep spec needs exactly one of 'rho' and 'lambd'.")
+    if 'seeds' in spec and ('seed' in spec or 'replications' in spec):
+        raise ValueError("Give either 'seeds' or 'seed' and 'replications' in the sweep spec.")
+    if spec.get('engine', DEFAULTS['engine']) not in ENGINES:
+        raise ValueError(f"Unknown engine {spec['engine']!r}, choose one of {sorted(ENGINES)}")
+
+    spec = dict(DEFAULTS, **spec)
+    for key in ('k', 'rho', 'lambd', 'seeds'):
+        if key in spec and spec[key] is not None and not isinstance(spec[key], list):
+            spec[key] = [spec[key]]
+    if spec['seeds'] is not None:
+        spec['replications'] = len(spec['seeds'])
+    return spec
+
+
+def makeGrid(spec):
+    # list of (k, load, Params) with load the rho or lambd value of the spec
+    from Experiment_3 import Params
+
+    axis = 'rho' if 'rho' in spec else 'lambd'
+    grid = []
+    for k in spec['k']:
+        for load in spec[axis]:
+            lambd = load * k * spec['mu'] if axis == 'rho' else load
+            grid.append((k, load, Params(lambd, spec['mu'], k, spec['timeLimit'])))
+    return axis, grid
+
+
+def runSpec(spec, cache=None):
+    # one record per grid point, with the replication half-widths when there are replications
+    axis, grid = makeGrid(spec)
+    paramsList = [params for k, load, params in grid]
+
+    if spec['replications'] > 1 or spec['antithetic'] or spec['controls']:
+        if spec['seeds'] is not None:
+            replications, seed = spec['replications'], spec['seeds']
+        else:
+            replications, seed = max(spec['replications'], 2), spec['seed']
+        replicated = runReplicatedSweep(paramsList, replications, seed, spec['engine'],
+                                        spec['workers'], spec['confidence'], cache, crn=spec['crn'],
+                                        antithetic=spec['antithetic'], controls=spec['controls'],
+                                        unstable=spec['unstable'], heavyTraffic=spec['heavyTraffic'])
+        results = [r.getResults() for r in replicated]
+        halfWidths = [[r.halfWidth[metric] for metric in METRICS] for r in replicated]
+    else:
+        seed = spec['seeds'][0] if spec['seeds'] is not None else spec['seed']
+        results = runSweep([(params, seed) for params in paramsList], spec['engine'], spec['workers'],
+                           cache=cache, crn=spec['crn'], unstable=spec['unstable'],
+                           heavyTraffic=spec['heavyTraffic'])
+        halfWidths = [None] * len(results)
+
+    records = []
+    for (k, load, params), result, halfWidth in zip(grid, results, halfWidths):
+        record = {'k': k, axis: load, 'lambd': params.lambd, 'mu': params.mu}
+        record.update(zip(METRICS, (float(value) for value in result[:len(METRICS)])))
+        if halfWidth is not None:
+            record.update((metric + 'HalfWidth', value) for metric, value in zip(METRICS, halfWidth))
+        records.append(record)
+    return axis, records
+
+
+def writeResults(records, outputDir):
+    os.makedirs(outputDir, exist_ok=True)
+    paths = [os.path.join(outputDir, 'results.json'), os.path.join(outputDir, 'results.csv')]
+
+    # inf and nan (skipped unstable points, their half-widths) are not JSON, they are written as null
+    jsonRecords = [{key: value if not isinstance(value, float) or math.isfinite(value) else None
+                    for key, value in record.items()} for record in records]
+    with open(paths[0], 'w') as f:
+        json.dump(jsonRecords, f, indent=2, allow_nan=False)
+
+    fields = list(records[0]) if records else []
+    with open(paths[1], 'w', newline='') as f:
+        writer = csv.DictWriter(f, fields)
+        writer.writeheader()
+        writer.writerows(records)
+    return paths
+
+
+def makeFigures(spec, axis, records):
+    # one figure per k over the load, or a single one over k if there is only one load
+    def errorsOf(selected):
+        if 'avgQlengthHalfWidth' not in selected[0]:
+            return None
+        return [[record[metric + 'HalfWidth'] for record in selected] for metric in METRICS]
+
+    def resultsOf(selected):
+        return [tuple(record[metric] for metric in METRICS) for record in selected]
+
+    # analytic curves only make sense for the single queue M/M/k engines
+    withAnalytic = spec['engine'] != 'multiqueue'
+    figures = []
+    if len(spec[axis]) == 1:
+        analytic = analyticResults([r['lambd'] for r in records], spec['mu'], spec['k']) if withAnalytic else None
+        figures.append(sweepFigure(spec['name'], spec['k'], resultsOf(records), 'Server (k)', errorsOf(records),
+                                   analytic))
+    else:
+        label = 'Ratio (ro)' if axis == 'rho' else 'Arrival rate (lambda)'
+        for k in spec['k']:
+            selected = [record for record in records if record['k'] == k]
+            analytic = analyticResults([r['lambd'] for r in selected], spec['mu'], k) if withAnalytic else None
+            figures.append(sweepFigure(f"{spec['name']}-k{k}", spec[axis], resultsOf(selected), label,
+                                       errorsOf(selected), analytic))
+    return figures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run an M/M/k simulation sweep described by a JSON or TOML spec.')
+    parser.add_argument('spec', help='sweep spec, .json or .toml')
+    parser.add_argument('-o', '--output', default='output', help='directory for the results and figures')
+    parser.add_argument('--workers', type=int, help='worker processes, overrides the spec')
+    parser.add_argument('--formats', nargs='+', choices=('png', 'svg'), help='figure formats, override the spec')
+    parser.add_argument('--no-figures', action='store_true', help='only write the result files')
+    parser.add_argument('--cache', nargs='?', const=DEFAULT_PATH, help='reuse results from a sqlite result cache')
+    args = parser.parse_args(argv)
+
+    spec = loadSpec(args.spec)
+    if args.workers is not None:
+        spec['workers'] = args.workers
+    if args.formats is not None:
+        spec['formats'] = args.formats
+
+    cache = None
+    if args.cache is not None or spec['cache']:
+        cache = ResultCache(args.cache or DEFAULT_PATH)
+
+    axis, records = runSpec(spec, cache)
+    paths = writeResults(records, args.output)
+    if not args.no_figures:
+        paths += renderFigures(makeFigures(spec, axis, records), args.output, tuple(spec['formats']),
+                               spec['workers'])
+    if cache is not None:
+        cache.close()
+
+    for path in paths:
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
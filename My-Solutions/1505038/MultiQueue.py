@@ -0,0 +1,64 @@
+"""
+Per-server queues with an index of their lengths, for join-shortest-queue.
+Each server has its own deque of waiting customers, so popping the head is O(1) instead of
+list.pop(0). The lengths are indexed by a lazy min-heap of (length, server) entries: every
+change of a queue pushes its new length and outdated entries are dropped when they reach
+the top, so shortest() is O(log k) amortized instead of a scan over all k queues. Ties go
+to the smallest server index, exactly like min() over the (length, index) list did. The
+heap is rebuilt once the outdated entries outnumber the live ones, which bounds its size.
+"""
+
+import heapq
+from collections import deque
+
+
+class MultiQueue:
+    def __init__(self, k):
+        self.k = k
+        self.queues = [deque() for i in range(k)]
+        self.index = [(0, i) for i in range(k)]  # already a heap
+        self.total = 0  # customers over all the queues
+
+    def length(self, i):
+        return len(self.queues[i])
+
+    def shortest(self):
+        # smallest server index among the shortest queues
+        index = self.index
+        queues = self.queues
+        while True:
+            length, i = index[0]
+            if len(queues[i]) == length:
+                return i
+            heapq.heappop(index)
+
+    def append(self, i, customer):
+        self.queues[i].append(customer)
+        self.total += 1
+        self.reindex(i)
+
+    def popleft(self, i):
+        # head of queue i, the customer to be served next
+        customer = self.queues[i].popleft()
+        self.total -= 1
+        self.reindex(i)
+        return customer
+
+    def pop(self, i):
+        # tail of queue i, the customer moved when balancing
+        customer = self.queues[i].pop()
+        self.total -= 1
+        self.reindex(i)
+        return customer
+
+    def reindex(self, i):
+        heapq.heappush(self.index, (len(self.queues[i]), i))
+        if len(self.index) > 2 * self.k + 64:
+            self.index = [(len(queue), j) for j, queue in enumerate(self.queues)]
+            heapq.heapify(self.index)
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, i):
+        return self.queues[i]
@@ -0,0 +1,144 @@
+#!/home/heisenberg/anaconda3/bin/python
+
+"""
+Python port of the single server program in Given_Codes/C-Code/main.c, for validating the
+engines against the C reference. It reads mm1.in and writes mm1.out byte for byte like the
+compiled program: the variates come from stream 1 of the Lcgrand port in the same order, and
+the clock, the delays and the area accumulators are float32 like the C floats, with
+expon() computed in double and rounded as C does. Two events only, so the event list is
+the two time_next_event entries and ties go to the arrival.
+
+    python Reference.py ../../Given_Codes/C-Code/mm1.in -o mm1.out
+"""
+
+import argparse
+import math
+
+import numpy as np
+
+from Lcgrand import Lcgrand
+
+
+Q_LIMIT = 100  # limit on the queue length, as in the C code
+NEVER = np.float32(1.0e+30)
+
+
+class ReferenceResults:
+    def __init__(self, meanInterarrival, meanService, delaysRequired):
+        self.meanInterarrival = meanInterarrival
+        self.meanService = meanService
+        self.delaysRequired = delaysRequired
+        self.avgDelay = None
+        self.avgQlength = None
+        self.util = None
+        self.simTime = None
+        self.overflowTime = None  # set when the queue outgrew Q_LIMIT and the run stopped
+
+    def getResults(self):
+        return self.avgQlength, self.avgDelay, self.util
+
+
+def readInput(path):
+    # "%f %f %d" of the C fscanf: two floats and the number of customers
+    with open(path) as f:
+        meanInterarrival, meanService, delaysRequired = f.read().split()[:3]
+    return np.float32(meanInterarrival), np.float32(meanService), int(delaysRequired)
+
+
+def runReference(meanInterarrival, meanService, delaysRequired, generator=None):
+    if generator is None:
+        generator = Lcgrand()
+    meanInterarrival = np.float32(meanInterarrival)
+    meanService = np.float32(meanService)
+    results = ReferenceResults(meanInterarrival, meanService, delaysRequired)
+
+    def expon(mean):
+        return np.float32(-float(mean) * math.log(float(generator.lcgrand(1))))
+
+    simTime = np.float32(0.0)
+    timeLastEvent = np.float32(0.0)
+    busy = 0
+    queue = []
+    delayed = 0
+    totalOfDelays = np.float32(0.0)
+    areaNumInQ = np.float32(0.0)
+    areaServerStatus = np.float32(0.0)
+    nextArrival = simTime + expon(meanInterarrival)
+    nextDeparture = NEVER
+
+    while delayed < delaysRequired:
+        # strict < as in timing(), so an arrival wins a tie
+        isArrival = nextArrival < np.float32(1.0e+29)
+        simTime = nextArrival
+        if nextDeparture < nextArrival:
+            isArrival = False
+            simTime = nextDeparture
+        elif not isArrival:
+            raise ValueError(f'Event list is empty at time {simTime:f}')
+
+        sinceLastEvent = simTime - timeLastEvent
+        timeLastEvent = simTime
+        areaNumInQ += np.float32(len(queue)) * sinceLastEvent
+        areaServerStatus += np.float32(busy) * sinceLastEvent
+
+        if isArrival:
+            nextArrival = simTime + expon(meanInterarrival)
+            if busy:
+                if len(queue) == Q_LIMIT:
+                    results.overflowTime = simTime
+                    return results
+                queue.append(simTime)
+            else:
+                totalOfDelays += np.float32(0.0)
+                delayed += 1
+                busy = 1
+                nextDeparture = simTime + expon(meanService)
+        elif not queue:
+            busy = 0
+            nextDeparture = NEVER
+        else:
+            totalOfDelays += simTime - queue.pop(0)
+            delayed += 1
+            nextDeparture = simTime + expon(meanService)
+
+    results.avgDelay = totalOfDelays / np.float32(delayed)
+    results.avgQlength = areaNumInQ / simTime
+    results.util = areaServerStatus / simTime
+    results.simTime = simTime
+    return results
+
+
+def formatReport(results):
+    # the text main.c writes to mm1.out, including its spacing and spelling
+    text = "Single server queuing system\n\n"
+    text += "Mean interarrival time%11.3f minutes \n\n" % results.meanInterarrival
+    text += "Mean service time%16.3f minutes\n\n" % results.meanService
+    text += "Number of customers%14d\n\n" % results.delaysRequired
+    if results.overflowTime is not None:
+        return text + "\nOverflow of the array time_arrival at time %f" % results.overflowTime
+
+    text += "\nAverage delay in queue%11.3f minutes\n\n" % results.avgDelay
+    text += "\nAverge number in queue%10.3f\n\n" % results.avgQlength
+    text += "Server utilization%15.3f\n\n" % results.util
+    text += "Time simulation ended%12.3f minutes" % results.simTime
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the C reference M/M/1 model on an mm1.in file.')
+    parser.add_argument('input', help='mm1.in: mean interarrival time, mean service time, number of customers')
+    parser.add_argument('-o', '--output', help='write the report here instead of printing it')
+    parser.add_argument('--newline', choices=('crlf', 'lf'), default='crlf',
+                        help='line endings of the output file, the shipped mm1.out uses crlf')
+    args = parser.parse_args(argv)
+
+    report = formatReport(runReference(*readInput(args.input)))
+    if args.output is None:
+        print(report)
+    else:
+        with open(args.output, 'w', newline='\r\n' if args.newline == 'crlf' else '\n') as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
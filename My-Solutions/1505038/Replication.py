@@ -0,0 +1,300 @@
+"""
+Independent replications with confidence intervals.
+A single run per sweep point gives no idea of the noise in the curves. Here every
+configuration is simulated N times with independent seeds (spawned from one base seed),
+the replications run in parallel through the sweep runner, and ReplicationResults holds
+the mean, standard error and Student-t confidence interval of every metric.
+With common random numbers (crn=True) replication r of every configuration uses the same
+seed, so configurations are compared on the same workload; a list of seeds instead of the
+base seed gives the replications' seeds explicitly, shared the same way. runPairedComparison() then
+works on the paired differences, whose variance is far below that of two independent runs.
+With antithetic=True every replication is a pair of runs on one seed, the second using
+1 - U for every uniform (see Variates); the pair average is the replication's estimate.
+With controls=True the estimates are adjusted by control variates: the observed mean
+interarrival and service times of each run, whose expectations 1/lambda and 1/mu are known.
+Each metric is regressed on them over the replications and the fitted part is removed.
+unstable and heavyTraffic are handed to Sweep.runSweep, so points without a steady state or
+in heavy traffic are settled the same way as in a single-run sweep.
+"""
+
+import functools
+import math
+
+import numpy as np
+
+from Sweep import runSweep, spawnSeeds
+
+
+METRICS = ('avgQlength', 'avgQdelay', 'util')
+
+
+def betaContinuedFraction(a, b, x):
+    # continued fraction of the incomplete beta function (modified Lentz)
+    tiny = 1e-300
+    c = 1.0
+    d = 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 300):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1.0) < 1e-15:
+            break
+    return h
+
+
+def regularizedBeta(a, b, x):
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * betaContinuedFraction(a, b, x) / a
+    return 1.0 - front * betaContinuedFraction(b, a, 1.0 - x) / b
+
+
+def tCdf(t, df):
+    tail = 0.5 * regularizedBeta(df / 2.0, 0.5, df / (df + t * t))
+    return 1.0 - tail if t > 0 else tail
+
+
+@functools.lru_cache(maxsize=None)
+def tQuantile(p, df):
+    # inverse of the Student-t CDF by bisection, cached since the same few values are asked for again and again
+    if p == 0.5:
+        return 0.0
+    if p < 0.5:
+        return -tQuantile(1.0 - p, df)
+
+    low, high = 0.0, 1.0
+    while tCdf(high, df) < p:
+        high *= 2.0
+    for i in range(100):
+        mid = (low + high) / 2.0
+        if tCdf(mid, df) < p:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2.0
+
+
+class ReplicationResults:
+    def __init__(self, params, samples, confidence=0.95):
+        self.params = params
+        self.samples = samples  # one getResults() tuple per replication
+        self.confidence = confidence
+        self.replications = len(samples)
+
+        self.mean = {}
+        self.stdDev = {}
+        self.stdErr = {}
+        self.halfWidth = {}
+
+        n = self.replications
+        t = tQuantile(0.5 + confidence / 2.0, n - 1) if n > 1 else math.inf
+        for i, metric in enumerate(METRICS):
+            values = [sample[i] for sample in samples]
+            mean = sum(values) / n
+            variance = sum((value - mean) ** 2 for value in values) / (n - 1) if n > 1 else math.inf
+
+            self.mean[metric] = mean
+            self.stdDev[metric] = math.sqrt(variance)
+            self.stdErr[metric] = math.sqrt(variance / n)
+            self.halfWidth[metric] = t * self.stdErr[metric]
+
+    def interval(self, metric):
+        return self.mean[metric] - self.halfWidth[metric], self.mean[metric] + self.halfWidth[metric]
+
+    def getResults(self):
+        # same shape as States.getResults(), with the replication means
+        return tuple(self.mean[metric] for metric in METRICS)
+
+    def getIntervals(self):
+        return tuple(self.interval(metric) for metric in METRICS)
+
+    def printResults(self):
+        print('############### Replication Results ##################')
+        print(f'Results: lambda = {self.params.lambd}, mu = {self.params.mu}, k = {self.params.k}')
+        print(f'Replications: {self.replications}, confidence: {self.confidence}')
+        for metric in METRICS:
+            low, high = self.interval(metric)
+            print(f'{metric}: {self.mean[metric]} +- {self.halfWidth[metric]} '
+                  f'(std err {self.stdErr[metric]}, CI [{low}, {high}])')
+        print('######################################################')
+
+
+class PairedResults(ReplicationResults):
+    # replication statistics of the differences first - second, replication by replication
+    def __init__(self, first, second, confidence=0.95):
+        self.first = first  # ReplicationResults of both configurations
+        self.second = second
+        differences = [tuple(a - b for a, b in zip(sampleA, sampleB))
+                       for sampleA, sampleB in zip(first.samples, second.samples)]
+        super().__init__(first.params, differences, confidence)
+
+    def varianceReduction(self, metric):
+        # variance of an unpaired difference over that of the paired one, i.e. how many
+        # times more replications independent runs would need for the same precision
+        paired = self.stdDev[metric] ** 2
+        unpaired = self.first.stdDev[metric] ** 2 + self.second.stdDev[metric] ** 2
+        return unpaired / paired if paired > 0 else math.inf
+
+    def printResults(self):
+        first, second = self.first.params, self.second.params
+        print('############### Paired Comparison ####################')
+        print(f'First: lambda = {first.lambd}, mu = {first.mu}, k = {first.k}')
+        print(f'Second: lambda = {second.lambd}, mu = {second.mu}, k = {second.k}')
+        print(f'Replications: {self.replications}, confidence: {self.confidence}')
+        for metric in METRICS:
+            low, high = self.interval(metric)
+            print(f'{metric} difference: {self.mean[metric]} +- {self.halfWidth[metric]} '
+                  f'(CI [{low}, {high}], variance reduction {self.varianceReduction(metric)})')
+        print('######################################################')
+
+
+class AntitheticResults(ReplicationResults):
+    # replication statistics of the antithetic pair averages
+    def __init__(self, params, plainSamples, mirroredSamples, confidence=0.95):
+        self.plain = ReplicationResults(params, plainSamples, confidence)
+        self.mirrored = ReplicationResults(params, mirroredSamples, confidence)
+        averages = [tuple((a + b) / 2.0 for a, b in zip(sampleA, sampleB))
+                    for sampleA, sampleB in zip(plainSamples, mirroredSamples)]
+        super().__init__(params, averages, confidence)
+
+    def varianceReduction(self, metric):
+        # variance of the mean of two independent runs over that of a pair average, i.e.
+        # how many times more runs independent replications would need for the same precision
+        single = (self.plain.stdDev[metric] ** 2 + self.mirrored.stdDev[metric] ** 2) / 2.0
+        pair = self.stdDev[metric] ** 2
+        return single / 2.0 / pair if pair > 0 else math.inf
+
+    def printResults(self):
+        super().printResults()
+        print('Antithetic pairs, variance reduction: ' +
+              ', '.join(f'{metric} {self.varianceReduction(metric)}' for metric in METRICS))
+
+
+class ControlVariateResults(ReplicationResults):
+    # replication statistics of the control variate adjusted estimates
+    def __init__(self, params, samples, confidence=0.95):
+        # samples: getResults() tuples followed by the getControls() pair
+        controlCount = len(samples[0]) - len(METRICS)
+        n = len(samples)
+        df = n - 1 - controlCount
+        if df < 1:
+            raise ValueError(f'Control variates need more than {controlCount + 1} replications.')
+
+        self.plain = ReplicationResults(params, [sample[:len(METRICS)] for sample in samples], confidence)
+        self.params = params
+        self.samples = samples
+        self.confidence = confidence
+        self.replications = n
+
+        self.mean = {}
+        self.stdDev = {}
+        self.stdErr = {}
+        self.halfWidth = {}
+        self.coefficients = {}  # estimated optimal coefficient of every control, per metric
+
+        data = np.array(samples, dtype=float)
+        controls = data[:, len(METRICS):]
+        centered = controls - controls.mean(axis=0)
+        t = tQuantile(0.5 + confidence / 2.0, df)
+        for i, metric in enumerate(METRICS):
+            values = data[:, i]
+            if np.isfinite(values).all():
+                # least squares fit of the metric on the controls; their true mean is 0
+                beta = np.linalg.lstsq(centered, values - values.mean(), rcond=None)[0]
+                residuals = values - values.mean() - centered @ beta
+                variance = float(residuals @ residuals) / df
+            else:
+                # an analytic limit such as the inf of a skipped unstable point, nothing to fit
+                beta = np.zeros(controlCount)
+                variance = math.nan
+            adjusted = values - controls @ beta
+
+            self.coefficients[metric] = tuple(beta.tolist())
+            self.mean[metric] = float(adjusted.mean())
+            self.stdDev[metric] = math.sqrt(variance)
+            self.stdErr[metric] = math.sqrt(variance / n)
+            self.halfWidth[metric] = t * self.stdErr[metric]
+
+    def varianceReduction(self, metric):
+        # variance of the plain estimate over that of the adjusted one
+        adjusted = self.stdErr[metric] ** 2
+        return self.plain.stdErr[metric] ** 2 / adjusted if adjusted > 0 else math.inf
+
+    def printResults(self):
+        super().printResults()
+        for metric in METRICS:
+            print(f'Control variates for {metric}: coefficients {self.coefficients[metric]}, '
+                  f'variance reduction {self.varianceReduction(metric)}')
+
+
+def runReplicatedSweep(paramsList, replications, seed, engine='event', workers=None, confidence=0.95, cache=None,
+                       crn=False, antithetic=False, controls=False, unstable='flag', heavyTraffic=None):
+    # all replications of all configurations go to the pool as one sweep
+    if isinstance(seed, (list, tuple)):
+        # explicit replication seeds, replication r of every configuration runs on seed[r]
+        if len(seed) != replications:
+            raise ValueError(f'Got {len(seed)} seeds for {replications} replications.')
+        seeds = list(seed) * len(paramsList)
+    elif crn:
+        # replication r of every configuration sees the same random numbers
+        seeds = spawnSeeds(seed, replications) * len(paramsList)
+    else:
+        seeds = spawnSeeds(seed, replications * len(paramsList))
+    points = [(params, seeds[i * replications + r]) for i, params in enumerate(paramsList) for r in range(replications)]
+    options = {'cache': cache, 'crn': crn, 'unstable': unstable, 'heavyTraffic': heavyTraffic}
+    if controls:
+        if antithetic:
+            raise ValueError('Use either antithetic pairs or control variates, not both.')
+        samples = runSweep(points, engine, workers, controls=True, **options)
+        return [ControlVariateResults(params, samples[i * replications:(i + 1) * replications], confidence)
+                for i, params in enumerate(paramsList)]
+
+    if antithetic:
+        # the mirrored half of every pair reuses the seeds of the plain half
+        samples = runSweep(points, engine, workers, antithetic=False, **options)
+        mirrored = runSweep(points, engine, workers, antithetic=True, **options)
+        return [AntitheticResults(params, samples[i * replications:(i + 1) * replications],
+                                  mirrored[i * replications:(i + 1) * replications], confidence)
+                for i, params in enumerate(paramsList)]
+
+    samples = runSweep(points, engine, workers, **options)
+
+    return [ReplicationResults(params, samples[i * replications:(i + 1) * replications], confidence)
+            for i, params in enumerate(paramsList)]
+
+
+def runExperimentSweep(paramsList, seed, engine='event', workers=None, replications=1, cache=None, crn=False):
+    # (results, errors) for an experiment figure: one run per configuration, or the replication
+    # means with their confidence interval half-widths as the error bars of every panel
+    if replications > 1:
+        replicated = runReplicatedSweep(paramsList, replications, seed, engine, workers, cache=cache, crn=crn)
+        results = [r.getResults() for r in replicated]
+        errors = [[r.halfWidth[metric] for r in replicated] for metric in METRICS]
+    else:
+        results = runSweep([(params, seed) for params in paramsList], engine, workers, cache=cache, crn=crn)
+        errors = [None] * len(METRICS)
+    return results, errors
+
+
+def runReplications(params, replications, seed, engine='event', workers=None, confidence=0.95, cache=None,
+                    antithetic=False, controls=False):
+    return runReplicatedSweep([params], replications, seed, engine, workers, confidence, cache,
+                              antithetic=antithetic, controls=controls)[0]
+
+
+def runPairedComparison(first, second, replications, seed, engine='event', workers=None, confidence=0.95,
+                        cache=None, crn=True):
+    # compares two configurations replication by replication, on common random numbers by default
+    results = runReplicatedSweep([first, second], replications, seed, engine, workers, confidence, cache, crn)
+    return PairedResults(results[0], results[1], confidence)
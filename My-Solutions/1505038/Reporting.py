@@ -0,0 +1,68 @@
+"""
+Headless figure export for the experiments.
+The experiments no longer import matplotlib or block on plt.show(). They describe a figure as
+plain data with sweepFigure(): the three stacked panels (avg queue length, avg delay,
+utilization, as subplot 311/312/313) against the swept parameter, with optional error bars
+and analytic curves. renderFigures() turns a batch of such descriptions into PNG and/or SVG
+files with the Agg backend. matplotlib is only imported there, so runs that never plot do
+not load it. With workers > 1 the figures are rendered in parallel worker processes.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+PANELS = ('Avg Q length', 'Avg Q delay (sec)', 'Util')
+
+
+def sweepFigure(name, x, results, xlabel, errors=None, analytic=None):
+    # results: one getResults() tuple per x; errors and analytic: one sequence per panel, or None
+    return {
+        'name': name,  # file name without extension
+        'x': list(x),
+        'series': [[float(result[i]) for result in results] for i in range(len(PANELS))],
+        'errors': None if errors is None else [None if e is None else list(e) for e in errors],
+        'analytic': None if analytic is None else [[float(value) for value in curve] for curve in analytic],
+        'xlabel': xlabel,
+    }
+
+
+def renderFigure(figure, outputDir='figures', formats=('png',)):
+    # returns the paths written
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+
+    # a Figure that is not managed by pyplot, so nothing is kept around after saving
+    canvas = Figure(figsize=(6.4, 7.2))
+    for i, ylabel in enumerate(PANELS):
+        axes = canvas.add_subplot(311 + i)
+        yerr = figure['errors'][i] if figure['errors'] is not None else None
+        axes.errorbar(figure['x'], figure['series'][i], yerr=yerr)
+        if figure['analytic'] is not None:
+            axes.plot(figure['x'], figure['analytic'][i], '--')
+        axes.set_xlabel(figure['xlabel'])
+        axes.set_ylabel(ylabel)
+    canvas.tight_layout()
+
+    os.makedirs(outputDir, exist_ok=True)
+    paths = []
+    for extension in formats:
+        path = os.path.join(outputDir, f"{figure['name']}.{extension}")
+        canvas.savefig(path)
+        paths.append(path)
+    return paths
+
+
+def renderFigures(figures, outputDir='figures', formats=('png',), workers=1):
+    # renders a batch of sweepFigure() descriptions, returns the list of paths written
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(figures))
+
+    if workers <= 1:
+        rendered = [renderFigure(figure, outputDir, formats) for figure in figures]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rendered = list(pool.map(renderFigure, figures, [outputDir] * len(figures), [formats] * len(figures)))
+    return [path for paths in rendered for path in paths]
@@ -0,0 +1,223 @@
+"""
+Event scheduler backends for the simulators.
+Every backend stores the (eventTime, seq, kind, server) records from Events.py and has the
+same three operations: push(event), pop() and len(). Events come out ordered by
+(eventTime, seq), so equal times are always served in scheduling order, whatever backend
+is used. The binary heap is the default; the calendar queue and the ladder queue have
+O(1) amortized push/pop and are meant for runs with many pending departures (large k).
+"""
+
+import heapq
+
+
+class HeapScheduler:
+    # the original heapq based event queue
+    def __init__(self):
+        self.events = []
+
+    def push(self, event):
+        heapq.heappush(self.events, event)
+
+    def pop(self):
+        return heapq.heappop(self.events)
+
+    def __len__(self):
+        return len(self.events)
+
+
+class CalendarQueue:
+    # Brown's calendar queue: a ring of buckets ("days") of fixed width, one year being
+    # nbuckets * width. Each bucket is a small heap, so ties inside a day stay stable.
+    minBuckets = 2
+    sampleSize = 25
+
+    def __init__(self, nbuckets=2, width=1.0):
+        self.size = 0
+        self.lastTime = 0.0
+        self.setCalendar(nbuckets, width)
+
+    def setCalendar(self, nbuckets, width):
+        self.nbuckets = nbuckets
+        self.width = width
+        self.buckets = [[] for i in range(nbuckets)]
+        self.day = int(self.lastTime / width)  # day of the last dequeued event, counted from time 0
+
+    def push(self, event):
+        heapq.heappush(self.buckets[int(event[0] / self.width) % self.nbuckets], event)
+        self.size += 1
+        if self.size > 2 * self.nbuckets:
+            self.resize(2 * self.nbuckets)
+
+    def pop(self):
+        if self.size == 0:
+            raise IndexError('pop from an empty calendar queue')
+
+        buckets = self.buckets
+        width = self.width
+        day = self.day
+        for i in range(self.nbuckets):
+            bucket = buckets[day % self.nbuckets]
+            if bucket and int(bucket[0][0] / width) <= day:
+                return self.take(bucket, day)
+            day += 1
+
+        # nothing due within a whole year: the day width no longer fits the event spacing,
+        # so recalibrate it and jump straight to the earliest event
+        self.resize(self.nbuckets)
+        buckets = self.buckets
+        width = self.width
+        earliest = min(bucket[0] for bucket in buckets if bucket)
+        day = int(earliest[0] / width)
+        return self.take(buckets[day % self.nbuckets], day)
+
+    def take(self, bucket, day):
+        event = heapq.heappop(bucket)
+        self.size -= 1
+        self.day = day
+        self.lastTime = event[0]
+        if self.size < self.nbuckets // 2 and self.nbuckets > self.minBuckets:
+            self.resize(self.nbuckets // 2)
+        return event
+
+    def resize(self, nbuckets):
+        events = [event for bucket in self.buckets for event in bucket]
+        self.setCalendar(nbuckets, self.estimateWidth(events))
+        for event in events:
+            heapq.heappush(self.buckets[int(event[0] / self.width) % self.nbuckets], event)
+
+    def estimateWidth(self, events):
+        # three times the average gap between the next few events, ignoring outlying gaps
+        sample = [event[0] for event in heapq.nsmallest(self.sampleSize, events)]
+        gaps = [b - a for a, b in zip(sample, sample[1:])]
+        if not gaps:
+            return self.width
+
+        average = sum(gaps) / len(gaps)
+        gaps = [gap for gap in gaps if gap <= 2 * average]
+        average = sum(gaps) / len(gaps) if gaps else average
+        if average <= 0:
+            return self.width
+        return 3 * average
+
+    def __len__(self):
+        return self.size
+
+
+class Rung:
+    def __init__(self, start, width, nbuckets):
+        self.start = start
+        self.width = width
+        self.buckets = [[] for i in range(nbuckets)]
+        self.current = 0  # buckets before this one have already been handed down
+
+    def currentStart(self):
+        return self.start + self.current * self.width
+
+    def insert(self, event):
+        idx = int((event[0] - self.start) / self.width)
+        # rounding can push an event just outside the live buckets
+        idx = min(max(idx, self.current), len(self.buckets) - 1)
+        self.buckets[idx].append(event)
+
+
+class LadderQueue:
+    # Tang, Goh and Thng's ladder queue: an unsorted Top for far future events, a ladder
+    # of rungs that bucket them ever more finely, and a small sorted Bottom (here a heap)
+    # that events are actually dequeued from.
+    threshold = 50  # a bucket bigger than this is split into a new rung instead of sorted
+    maxRungs = 8
+
+    def __init__(self):
+        self.size = 0
+        self.top = []
+        self.topStart = float('-inf')
+        self.topMin = float('inf')
+        self.topMax = float('-inf')
+        self.rungs = []
+        self.bottom = []
+
+    def push(self, event):
+        self.size += 1
+        eventTime = event[0]
+        if eventTime >= self.topStart:
+            self.top.append(event)
+            self.topMin = min(self.topMin, eventTime)
+            self.topMax = max(self.topMax, eventTime)
+            return
+
+        for rung in self.rungs:
+            if eventTime >= rung.currentStart():
+                rung.insert(event)
+                return
+
+        heapq.heappush(self.bottom, event)
+
+    def pop(self):
+        if not self.bottom:
+            self.refillBottom()
+        self.size -= 1
+        return heapq.heappop(self.bottom)
+
+    def refillBottom(self):
+        while not self.bottom:
+            if not self.rungs:
+                if not self.top:
+                    raise IndexError('pop from an empty ladder queue')
+                self.spreadTop()
+                continue
+
+            rung = self.rungs[-1]
+            while rung.current < len(rung.buckets) and not rung.buckets[rung.current]:
+                rung.current += 1
+            if rung.current == len(rung.buckets):
+                self.rungs.pop()
+                continue
+
+            bucket = rung.buckets[rung.current]
+            bucketStart = rung.currentStart()
+            rung.buckets[rung.current] = []
+            rung.current += 1
+
+            width = rung.width / len(bucket)
+            if len(bucket) > self.threshold and len(self.rungs) < self.maxRungs and width > 0:
+                child = Rung(bucketStart, width, len(bucket))
+                for event in bucket:
+                    child.insert(event)
+                self.rungs.append(child)
+            else:
+                heapq.heapify(bucket)
+                self.bottom = bucket
+
+    def spreadTop(self):
+        top = self.top
+        width = (self.topMax - self.topMin) / len(top)
+        if width > 0:
+            rung = Rung(self.topMin, width, len(top) + 1)
+            for event in top:
+                rung.insert(event)
+            self.rungs.append(rung)
+        else:
+            # every event in Top has the same time
+            heapq.heapify(top)
+            self.bottom = top
+
+        self.topStart = self.topMax
+        self.top = []
+        self.topMin = float('inf')
+        self.topMax = float('-inf')
+
+    def __len__(self):
+        return self.size
+
+
+SCHEDULERS = {
+    'heap': HeapScheduler,
+    'calendar': CalendarQueue,
+    'ladder': LadderQueue,
+}
+
+
+def makeScheduler(name='heap'):
+    if name not in SCHEDULERS:
+        raise ValueError(f'Unknown scheduler {name!r}, choose one of {sorted(SCHEDULERS)}')
+    return SCHEDULERS[name]()
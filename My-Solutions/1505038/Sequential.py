@@ -0,0 +1,138 @@
+"""
+Sequential stopping: run until a target confidence interval half-width is reached.
+Instead of a fixed timeLimit, the event simulator is given a checkpoint interval and a
+SequentialStopper observer. At every checkpoint the stopper closes a batch of the chosen
+metric; once there are enough batches it computes a batch means confidence interval and
+ends the run when the relative half-width drops below the target. The number of batches
+is kept bounded by merging neighbouring batches (doubling the batch size), which keeps
+the batch means close to independent as the run grows. An event, wall clock or simulated
+time budget still ends the run if the target is never reached.
+"""
+
+import math
+import time
+
+from Replication import tQuantile
+
+
+# metric -> (numerator, denominator) accumulators it is the ratio of
+METRIC_RATIOS = {
+    'avgQlength': ('queueArea', 'time'),
+    'avgQdelay': ('totalDelay', 'totalServed'),
+    'util': ('totalServingTime', 'time'),
+}
+
+
+def snapshot(sim):
+    states = sim.states
+    return {
+        'time': sim.now(),
+        'queueArea': states.queueArea,
+        'totalDelay': states.totalDelay,
+        'totalServed': states.totalServed,
+        'totalServingTime': states.totalServingTime,
+    }
+
+
+class BatchMeans:
+    def __init__(self, maxBatches=40):
+        self.maxBatches = maxBatches
+        self.batches = []  # (numerator, denominator) sums of every closed batch
+        self.batchSize = 1  # checkpoints per batch
+        self.pending = [0.0, 0.0]
+        self.pendingCount = 0
+
+    def add(self, numerator, denominator):
+        self.pending[0] += numerator
+        self.pending[1] += denominator
+        self.pendingCount += 1
+        if self.pendingCount < self.batchSize:
+            return
+
+        self.batches.append(tuple(self.pending))
+        self.pending = [0.0, 0.0]
+        self.pendingCount = 0
+
+        if len(self.batches) >= self.maxBatches:
+            pairs = zip(self.batches[0::2], self.batches[1::2])
+            self.batches = [(a[0] + b[0], a[1] + b[1]) for a, b in pairs]
+            self.batchSize *= 2
+
+    def estimate(self, confidence=0.95):
+        # point estimate over all closed batches and the half-width of its confidence interval
+        totalNumerator = sum(numerator for numerator, denominator in self.batches)
+        totalDenominator = sum(denominator for numerator, denominator in self.batches)
+        means = [numerator / denominator for numerator, denominator in self.batches if denominator > 0]
+        if len(means) < 2 or totalDenominator <= 0:
+            return math.nan, math.inf
+
+        n = len(means)
+        average = sum(means) / n
+        variance = sum((mean - average) ** 2 for mean in means) / (n - 1)
+        halfWidth = tQuantile(0.5 + confidence / 2.0, n - 1) * math.sqrt(variance / n)
+        return totalNumerator / totalDenominator, halfWidth
+
+
+class SequentialStopper:
+    def __init__(self, metric='avgQdelay', target=0.05, confidence=0.95, minBatches=10, maxBatches=40,
+                 maxEvents=None, maxWallTime=None):
+        if metric not in METRIC_RATIOS:
+            raise ValueError(f'Unknown metric {metric!r}, choose one of {sorted(METRIC_RATIOS)}')
+
+        self.metric = metric
+        self.target = target  # relative half-width to reach
+        self.confidence = confidence
+        self.minBatches = minBatches
+        self.maxEvents = maxEvents
+        self.maxWallTime = maxWallTime  # seconds
+
+        self.batchMeans = BatchMeans(maxBatches)
+        self.last = dict.fromkeys(('time', 'queueArea', 'totalDelay', 'totalServed', 'totalServingTime'), 0.0)
+        self.startWallTime = time.perf_counter()
+
+        self.estimate = math.nan
+        self.halfWidth = math.inf
+        self.converged = False
+        self.budgetExhausted = False
+
+    def relativeHalfWidth(self):
+        if self.estimate == 0 or math.isnan(self.estimate):
+            return math.inf
+        return self.halfWidth / abs(self.estimate)
+
+    def observe(self, sim):
+        current = snapshot(sim)
+        numerator, denominator = METRIC_RATIOS[self.metric]
+        self.batchMeans.add(current[numerator] - self.last[numerator], current[denominator] - self.last[denominator])
+        self.last = current
+
+        if len(self.batchMeans.batches) >= self.minBatches:
+            self.estimate, self.halfWidth = self.batchMeans.estimate(self.confidence)
+            if self.relativeHalfWidth() <= self.target:
+                self.converged = True
+                sim.stopRequested = True
+
+        # sim.seq counts the scheduled events, which is what the run has cost so far
+        if self.maxEvents is not None and sim.seq >= self.maxEvents:
+            self.budgetExhausted = True
+            sim.stopRequested = True
+        if self.maxWallTime is not None and time.perf_counter() - self.startWallTime >= self.maxWallTime:
+            self.budgetExhausted = True
+            sim.stopRequested = True
+
+    def finish(self, sim):
+        pass
+
+
+def runToPrecision(sim, metric='avgQdelay', target=0.05, checkpointInterval=None, confidence=0.95,
+                   maxEvents=10000000, maxWallTime=None):
+    # sim must be configured; params.timeLimit = None leaves the horizon open, otherwise it
+    # stays a hard limit on simulated time
+    if checkpointInterval is None:
+        checkpointInterval = 100.0 / sim.params.lambd  # about a hundred arrivals per checkpoint
+
+    stopper = SequentialStopper(metric, target, confidence, maxEvents=maxEvents, maxWallTime=maxWallTime)
+    sim.checkpointInterval = checkpointInterval
+    sim.observers.append(stopper)
+    sim.run()
+    return stopper
@@ -0,0 +1,138 @@
+"""
+Streaming quantiles of the queue delays with a KLL sketch.
+Keeping every delay of a long run just to read off p50/p95/p99 costs memory in the number of
+customers. A KLL sketch keeps a stack of compactors instead: level h holds items that each
+stand for 2^h delays. When the sketch is full a level is sorted and every other item (from
+a random offset) is promoted to the next level, so the memory stays O(k log(n / k)) and the
+rank error is about 1.7 / k of n. Sketches of the same k can be merged, for example those of
+parallel replications, and toDict()/fromDict() carry one through JSON (sweep cache, workers).
+A States only keeps a sketch when built with States(sketch=True), as runSweep(sketch=True)
+does, so runs that only need the means do not pay for it per customer.
+"""
+
+import math
+import random
+
+
+class KllSketch:
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.c = 2.0 / 3.0  # capacity ratio between consecutive levels
+        self.compactors = [[]]
+        self.count = 0  # items fed so far
+        self.size = 0  # items held
+        self.maxSize = 0
+        self.rng = random.Random(seed)  # compaction offsets, seeded so runs are reproducible
+        self.updateMaxSize()
+
+    def capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.c ** depth * self.k)) + 1
+
+    def updateMaxSize(self):
+        self.maxSize = sum(self.capacity(level) for level in range(len(self.compactors)))
+
+    def update(self, value):
+        self.compactors[0].append(value)
+        self.count += 1
+        self.size += 1
+        if self.size >= self.maxSize:
+            self.compress()
+
+    def extend(self, values):
+        # bulk update, e.g. with the delays of a vectorized engine
+        values = list(values)
+        start = 0
+        while start < len(values):
+            room = max(1, self.maxSize - self.size)
+            chunk = values[start:start + room]
+            self.compactors[0].extend(chunk)
+            self.count += len(chunk)
+            self.size += len(chunk)
+            start += len(chunk)
+            while self.size >= self.maxSize:
+                self.compress()
+
+    def compress(self):
+        # compacts the lowest level that is over its capacity
+        for level, compactor in enumerate(self.compactors):
+            if len(compactor) >= self.capacity(level):
+                if level + 1 == len(self.compactors):
+                    self.compactors.append([])
+                    self.updateMaxSize()
+
+                compactor.sort()
+                # an odd item out stays at this level
+                keep = [compactor.pop()] if len(compactor) % 2 else []
+                offset = self.rng.getrandbits(1)
+                self.compactors[level + 1].extend(compactor[offset::2])
+                self.compactors[level] = keep
+                break
+        self.size = sum(len(compactor) for compactor in self.compactors)
+
+    def merge(self, other):
+        if other.k != self.k:
+            raise ValueError('Only sketches with the same k can be merged.')
+
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        self.updateMaxSize()
+        for level, compactor in enumerate(other.compactors):
+            self.compactors[level].extend(compactor)
+        self.count += other.count
+        self.size = sum(len(compactor) for compactor in self.compactors)
+        while self.size >= self.maxSize:
+            self.compress()
+
+    def weightedItems(self):
+        # (value, weight) pairs in increasing order of value
+        items = [(value, 1 << level) for level, compactor in enumerate(self.compactors) for value in compactor]
+        items.sort()
+        return items
+
+    def quantiles(self, qs):
+        # one value per q in qs; nan for an empty sketch
+        items = self.weightedItems()
+        if not items:
+            return [math.nan for q in qs]
+
+        total = sum(weight for value, weight in items)
+        results = []
+        for q in qs:
+            target = q * total
+            cumulative = 0
+            result = items[-1][0]
+            for value, weight in items:
+                cumulative += weight
+                if cumulative >= target:
+                    result = value
+                    break
+            results.append(result)
+        return results
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def toDict(self):
+        return {'k': self.k, 'count': self.count, 'compactors': self.compactors}
+
+    @classmethod
+    def fromDict(cls, data):
+        sketch = cls(data['k'])
+        sketch.compactors = [list(compactor) for compactor in data['compactors']]
+        sketch.count = data['count']
+        sketch.size = sum(len(compactor) for compactor in sketch.compactors)
+        sketch.updateMaxSize()
+        return sketch
+
+    def __len__(self):
+        return self.count
+
+
+def mergeSketches(sketches):
+    # a new sketch holding all of the given ones
+    sketches = list(sketches)
+    merged = KllSketch(sketches[0].k if sketches else 200)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
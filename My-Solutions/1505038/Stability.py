@@ -0,0 +1,62 @@
+"""
+Divergence detection for runs that have no steady state.
+With lambda >= k mu the queue grows without bound, and a fixed-horizon run only returns
+averages that depend on the horizon while its queue eats memory. Up front this is decided
+analytically (Analytic.isStable); during a run DivergenceDetector watches the queue at
+every checkpoint. The run is flagged as diverging once the queue holds more than a fraction
+tolerance of all arrivals so far and is still growing over the second half of the
+checkpoints, or as soon as it reaches the simulator's queue cap. A flagged run is stopped
+and sim.diverged is set; its averages are then lower bounds only.
+"""
+
+DEFAULT_QUEUE_CAP = 1000000  # waiting customers
+
+
+def slope(points):
+    # least squares slope of (x, y) points
+    n = len(points)
+    meanX = sum(x for x, y in points) / n
+    meanY = sum(y for x, y in points) / n
+    sxx = sum((x - meanX) ** 2 for x, y in points)
+    sxy = sum((x - meanX) * (y - meanY) for x, y in points)
+    return sxy / sxx if sxx > 0 else 0.0
+
+
+class DivergenceDetector:
+    def __init__(self, tolerance=0.05, minCheckpoints=50):
+        self.tolerance = tolerance
+        self.minCheckpoints = minCheckpoints
+        self.history = []  # (time, people in queue) at every checkpoint
+        self.diverged = False
+
+    def observe(self, sim):
+        queueLength = sim.states.peopleInQueue
+        self.history.append((sim.now(), queueLength))
+        if len(self.history) < self.minCheckpoints:
+            return
+
+        # sim.variates counts the arrivals drawn so far
+        if queueLength > self.tolerance * sim.variates.arrivals and slope(self.history[len(self.history) // 2:]) > 0:
+            self.diverged = True
+            sim.diverged = True
+            sim.stopRequested = True
+
+    def finish(self, sim):
+        if sim.diverged:
+            self.diverged = True
+
+
+def detectDivergence(sim, checkpointInterval=None, queueCap=DEFAULT_QUEUE_CAP, tolerance=0.05, minCheckpoints=50):
+    # sim must be configured; attaches the detector and the queue cap, the caller then runs the simulation
+    if sim.checkpointInterval is None:
+        if checkpointInterval is None:
+            if sim.params.timeLimit is not None:
+                checkpointInterval = sim.params.timeLimit / 500.0
+            else:
+                checkpointInterval = 100.0 / sim.params.lambd
+        sim.checkpointInterval = checkpointInterval
+    sim.queueCap = queueCap
+
+    detector = DivergenceDetector(tolerance, minCheckpoints)
+    sim.observers.append(detector)
+    return detector
@@ -0,0 +1,164 @@
+"""
+Parallel parameter sweeps.
+A sweep is a list of (params, seed) points. Every point is an independent simulation, so
+the points are fanned out over a process pool and the getResults() tuples are gathered
+back in sweep order. Each point carries its own seed, so a point gives the same result
+whichever worker runs it, and the plots are identical to running the sweep serially.
+With crn=True the engine runs with common random numbers: customer n gets the n-th draw of
+the arrival and of the service stream, so points sharing a seed see the same workload.
+antithetic=False/True selects the plain or the mirrored run of an antithetic pair (see
+Variates), None the default sampler. With controls=True a point returns the two control
+variates of getControls() after the getResults() tuple.
+Points with lambda >= k mu have no steady state. unstable='flag' (the default) simulates them
+but reports them, 'skip' returns their analytic limit (inf, inf, 1) without simulating and
+'detect' simulates them with Stability's divergence detection and queue cap, so they stop
+once the queue runs away. Stable points always run to their time limit: near rho = 1 their
+queue fluctuates enough to look like divergence, so they get no detector. With
+heavyTraffic set to a rho threshold, stable points at or above it are not simulated but get
+the Halfin-Whitt heavy-traffic approximation of Analytic, which depends on k and is only
+meant for rho close to 1. With sketch=True every simulated point also returns its delay
+sketch as Sketch.KllSketch.toDict() (None for points that were not simulated), ready to be
+merged over replications with Sketch.mergeSketches().
+"""
+
+import importlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from Analytic import heavyTrafficResults, isStable
+from Cache import makeKey
+
+
+# engine name -> (simulator class, States class the engine fills in), as module.attribute
+ENGINES = {
+    'event': ('Experiment_3.Simulator', 'Experiment_3.States'),
+    'ctmc': ('Ctmc.CtmcSimulator', 'Experiment_3.States'),
+    'lindley': ('Lindley.LindleySimulator', 'Experiment_3.States'),
+    'multiqueue': ('Experiment_4.Simulator', 'Experiment_4.States'),
+}
+
+# engines that can give customer n the n-th interarrival and service draw. The single queue
+# engines serve in arrival order, so they always do; the multi-queue one needs its crn mode
+CRN_ENGINES = ('event', 'lindley', 'multiqueue')
+
+# engines that report the observed mean interarrival and service times through getControls()
+CONTROL_ENGINES = ('event', 'lindley', 'multiqueue')
+
+
+def loadAttr(path):
+    moduleName, attr = path.rsplit('.', 1)
+    return getattr(importlib.import_module(moduleName), attr)
+
+
+def spawnSeeds(seed, count):
+    # independent, reproducible seeds for count runs, all derived from one base seed
+    return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(count)]
+
+
+def runPoint(engine, lambd, mu, k, timeLimit, seed, sequential=None, warmup=False, crn=False, antithetic=None,
+             controls=False, divergence=False, sketch=False):
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown engine {engine!r}, choose one of {sorted(ENGINES)}')
+
+    simulatorPath, statesPath = ENGINES[engine]
+    Params = loadAttr('Experiment_3.Params')
+
+    sim = loadAttr(simulatorPath)(seed, antithetic=antithetic)
+    sim.configure(Params(lambd, mu, k, timeLimit), loadAttr(statesPath)(sketch=sketch))
+    if (sequential is not None or warmup or divergence) and engine != 'event':
+        raise ValueError('Sequential stopping, warm-up and divergence detection need the checkpoints of the event engine.')
+    if crn and engine not in CRN_ENGINES:
+        raise ValueError(f'Common random numbers need an engine that follows customers, choose one of {CRN_ENGINES}')
+    if crn and engine == 'multiqueue':
+        sim.crn = True
+    if controls and engine not in CONTROL_ENGINES:
+        raise ValueError(f'Control variates need an engine that draws every customer, choose one of {CONTROL_ENGINES}')
+
+    if warmup:
+        loadAttr('Warmup.detectWarmup')(sim)
+    if divergence:
+        loadAttr('Stability.detectDivergence')(sim)
+    if sequential is not None:
+        # keyword arguments for Sequential.runToPrecision()
+        loadAttr('Sequential.runToPrecision')(sim, **sequential)
+    else:
+        sim.run()
+
+    if divergence and sim.diverged:
+        print(f'lambda = {lambd}, mu = {mu}, k = {k}: run diverged and was stopped at time {sim.now()}')
+    results = sim.getResults()
+    if controls:
+        results += sim.getControls()
+    if sketch:
+        results += (sim.states.delaySketch.toDict(),)
+    return results
+
+
+def runJobs(jobs, workers):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+
+    if workers <= 1:
+        return [runPoint(*job) for job in jobs]
+
+    # a few chunks per worker keeps the pool busy without paying IPC per point
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(runPoint, *zip(*jobs), chunksize=chunksize))
+
+
+def runSweep(points, engine='event', workers=None, sequential=None, warmup=False, cache=None, crn=False,
+             antithetic=None, controls=False, unstable='flag', heavyTraffic=None, sketch=False):
+    # points: list of (params, seed); returns one getResults() tuple per point, in order.
+    # With a Cache.ResultCache only the points missing from it are simulated.
+    if unstable not in ('flag', 'skip', 'detect'):
+        raise ValueError(f"Unknown unstable mode {unstable!r}, choose one of 'flag', 'skip', 'detect'")
+
+    lambd, mu, k = (np.array([getattr(params, name) for params, seed in points], dtype=float)
+                    for name in ('lambd', 'mu', 'k'))
+    stable = isStable(lambd, mu, k)
+    # only the points without a steady state are watched for divergence
+    jobs = [(engine, params.lambd, params.mu, params.k, params.timeLimit, seed, sequential, warmup, crn, antithetic,
+             controls, unstable == 'detect' and not bool(stable[i]), sketch) for i, (params, seed) in enumerate(points)]
+    results = [None] * len(jobs)
+
+    # points that are settled analytically, without simulation
+    approximate = np.zeros(len(jobs), dtype=bool)
+    if heavyTraffic is not None:
+        approximate = stable & (lambd / (k * mu) >= heavyTraffic)
+    limits = list(zip(*heavyTrafficResults(lambd, mu, k)))
+    for i, (job, limit) in enumerate(zip(jobs, limits)):
+        if not stable[i]:
+            if unstable == 'flag':
+                print(f'lambda = {job[1]}, mu = {job[2]}, k = {job[3]}: unstable (lambda >= k mu), '
+                      f'the results depend on the time limit')
+            elif unstable == 'skip':
+                results[i] = (np.inf, np.inf, 1.0)
+        elif approximate[i]:
+            results[i] = tuple(float(value) for value in limit)
+        if results[i] is not None and controls:
+            results[i] += (0.0, 0.0)
+        if results[i] is not None and sketch:
+            results[i] += (None,)
+
+    keys = []
+    if cache is not None:
+        keys = [makeKey(*job[:6], sequential=sequential, warmup=warmup, crn=crn, antithetic=antithetic,
+                        controls=controls, divergence=job[11], sketch=sketch) for job in jobs]
+        for i, key in enumerate(keys):
+            if results[i] is not None:
+                continue
+            value = cache.get(key)
+            if value is not None:
+                results[i] = tuple(value)
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        for i, result in zip(missing, runJobs([jobs[i] for i in missing], workers)):
+            results[i] = result
+            if cache is not None:
+                cache.put(keys[i], result)
+    return results
@@ -0,0 +1,82 @@
+"""
+Binary, columnar event traces.
+Instead of printing every event, a simulator can be given a TraceRecorder (sim.trace).
+Each event is written as (time, kind, server, queueLength) into preallocated NumPy column
+buffers, queueLength being what the event sees before it is processed. When a chunk is
+full it is appended to one .npy file per column inside the trace directory.
+The .npy headers are fixed-size and rewritten with the final length on close(), so the
+columns can be re-read with loadTrace() as memory-mapped arrays without loading the
+whole trace. A simulator without a recorder runs the untraced loop and pays nothing.
+"""
+
+import os
+
+import numpy as np
+
+
+COLUMNS = (
+    ('time', np.dtype('<f8')),
+    ('kind', np.dtype('i1')),
+    ('server', np.dtype('<i4')),
+    ('queueLength', np.dtype('<i4')),
+)
+
+HEADER_SIZE = 128  # bytes, room for any shape up to 2**63
+
+
+def writeHeader(f, dtype, length):
+    # .npy version 1.0 header padded to a fixed size so it can be rewritten in place
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (np.lib.format.dtype_to_descr(dtype), length)
+    header = header.ljust(HEADER_SIZE - 10 - 1) + '\n'
+    f.seek(0)
+    f.write(np.lib.format.magic(1, 0))
+    f.write(len(header).to_bytes(2, 'little'))
+    f.write(header.encode('latin1'))
+
+
+class TraceRecorder:
+    def __init__(self, path, chunkSize=65536):
+        self.path = path
+        self.chunkSize = chunkSize
+        self.count = 0  # events already flushed to disk
+        self.fill = 0  # events waiting in the buffers
+
+        os.makedirs(path, exist_ok=True)
+        self.buffers = [np.empty(chunkSize, dtype) for name, dtype in COLUMNS]
+        self.time, self.kind, self.server, self.queueLength = self.buffers
+        self.files = []
+        for name, dtype in COLUMNS:
+            f = open(os.path.join(path, name + '.npy'), 'wb')
+            writeHeader(f, dtype, 0)
+            self.files.append(f)
+
+    def record(self, eventTime, kind, server, queueLength):
+        i = self.fill
+        self.time[i] = eventTime
+        self.kind[i] = kind
+        self.server[i] = server
+        self.queueLength[i] = queueLength
+        self.fill = i + 1
+        if self.fill == self.chunkSize:
+            self.flush()
+
+    def flush(self):
+        for f, buffer in zip(self.files, self.buffers):
+            f.write(buffer[:self.fill].tobytes())
+        self.count += self.fill
+        self.fill = 0
+
+    def close(self):
+        self.flush()
+        for f, (name, dtype) in zip(self.files, COLUMNS):
+            writeHeader(f, dtype, self.count)
+            f.close()
+        self.files = []
+
+    def __len__(self):
+        return self.count + self.fill
+
+
+def loadTrace(path):
+    # dict of column name -> read-only memory-mapped array
+    return {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name, dtype in COLUMNS}
@@ -0,0 +1,76 @@
+"""
+Block-buffered exponential variates for the simulators.
+Calling random.expovariate once per event costs a Python level RNG call every time, so
+here the exponentials are generated by NumPy in blocks and handed out one at a time.
+Arrivals and services get separate streams, both derived from the simulator's seed.
+Since each stream is used for one thing only, the n-th interarrival time and the n-th
+service requirement are the same in every run with the same seed. A simulator that gives
+customer n the n-th service draw therefore runs on common random numbers.
+For antithetic replications the exponentials can instead be made by inversion from the
+uniforms: antithetic=False gives -log(1 - U), antithetic=True -log(U) from the very same U,
+so a pair of runs with one seed and opposite flags is negatively correlated. The default
+antithetic=None keeps NumPy's faster standard_exponential sampler.
+ExpoVariates also keeps the sums of the unit rate draws it handed out, whose known mean of
+1 makes them control variates (see getControls()).
+"""
+
+import numpy as np
+
+
+TINY = np.finfo(float).tiny  # U can be exactly 0, keep -log(U) finite
+
+
+def makeStreams(seed, count=2):
+    # independent generators spawned from one seed, in a fixed order: arrivals, services, ...
+    return [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(count)]
+
+
+def exponentials(rng, size, antithetic=None):
+    # unit rate exponentials as a NumPy array, see the module docstring for antithetic
+    if antithetic is None:
+        return rng.standard_exponential(size)
+    u = rng.random(size)
+    if antithetic:
+        return -np.log(np.maximum(u, TINY))
+    return -np.log1p(-u)
+
+
+def blockStream(rng, blockSize, antithetic=None):
+    # unit rate exponentials, a new block is only drawn once the previous one is used up
+    while True:
+        yield from exponentials(rng, blockSize, antithetic).tolist()
+
+
+def uniformStream(rng, blockSize, antithetic=None):
+    # U(0, 1) variates, block by block like blockStream; 1 - U for the antithetic run
+    while True:
+        u = rng.random(blockSize)
+        yield from (1.0 - u if antithetic else u).tolist()
+
+
+class ExpoVariates:
+    def __init__(self, seed, blockSize=4096, antithetic=None):
+        arrivalRng, serviceRng = makeStreams(seed)
+        self.arrivalStream = blockStream(arrivalRng, blockSize, antithetic)
+        self.serviceStream = blockStream(serviceRng, blockSize, antithetic)
+        self.arrivalSum = 0.0  # unit rate draws handed out so far, and their count
+        self.arrivals = 0
+        self.serviceSum = 0.0
+        self.services = 0
+
+    def arrival(self, lambd):
+        x = next(self.arrivalStream)
+        self.arrivalSum += x
+        self.arrivals += 1
+        return x / lambd
+
+    def service(self, mu):
+        x = next(self.serviceStream)
+        self.serviceSum += x
+        self.services += 1
+        return x / mu
+
+    def getControls(self):
+        # (observed mean interarrival time * lambd - 1, observed mean service time * mu - 1), both have mean 0
+        return (self.arrivalSum / self.arrivals - 1.0 if self.arrivals else 0.0,
+                self.serviceSum / self.services - 1.0 if self.services else 0.0)
@@ -0,0 +1,91 @@
+"""
+Warm-up truncation for steady-state estimates (MSER-5).
+The simulators start empty, so the accumulators in States are biased by the first part of
+every run. MserWarmup is a checkpoint observer: at every checkpoint it records the
+accumulators and the time-average queue length over the last interval. The observations
+are grouped in batches of five and the truncation point is the batch d that minimises
+MSER(d) = sum over j >= d of (Y(j) - mean(Y(d:)))^2 / (n - d)^2, searched over the first half
+of the run. The search runs once, when the run finishes; the accumulators are then reset
+to that point by subtracting the snapshot taken there, and the warm-up time is left in
+States.warmupTime. Time histograms, when the States keeps them, are snapshotted at the
+batch boundaries only and truncated the same way. A KLL sketch cannot forget items, so the
+delay quantiles still include the warm-up.
+"""
+
+import math
+
+from Sequential import snapshot
+
+
+def mser(observations, batchSize=5):
+    # index of the first observation to keep according to MSER-batchSize
+    batches = [sum(observations[i:i + batchSize]) / batchSize
+               for i in range(0, len(observations) - batchSize + 1, batchSize)]
+    n = len(batches)
+    if n < 2:
+        return 0
+
+    best, bestValue = 0, math.inf
+    suffixSum = 0.0
+    suffixSquares = 0.0
+    values = [0.0] * n
+    for d in range(n - 1, -1, -1):
+        suffixSum += batches[d]
+        suffixSquares += batches[d] * batches[d]
+        kept = n - d
+        values[d] = (suffixSquares - suffixSum * suffixSum / kept) / (kept * kept)
+
+    for d in range(n // 2 + 1):
+        if values[d] < bestValue:
+            best, bestValue = d, values[d]
+    return best * batchSize
+
+
+class MserWarmup:
+    def __init__(self, batchSize=5):
+        self.batchSize = batchSize
+        self.snapshots = [dict.fromkeys(('time', 'queueArea', 'totalDelay', 'totalServed', 'totalServingTime'), 0.0)]
+        self.observations = []  # time-average queue length between consecutive checkpoints
+        self.truncation = 0  # checkpoints dropped
+        self.warmupTime = 0.0
+
+    def observe(self, sim):
+        current = snapshot(sim)
+        last = self.snapshots[-1]
+        self.observations.append((current['queueArea'] - last['queueArea']) / (current['time'] - last['time']))
+        # mser() only cuts at batch boundaries, so the histograms are copied there only
+        if sim.states.queueHistogram is not None and len(self.observations) % self.batchSize == 0:
+            current['histograms'] = (list(sim.states.queueHistogram.weights),
+                                     list(sim.states.systemHistogram.weights))
+        self.snapshots.append(current)
+
+    def finish(self, sim):
+        # reset the accumulators to the truncation point
+        self.truncation = mser(self.observations, self.batchSize)
+        cut = self.snapshots[self.truncation]
+        self.warmupTime = cut['time']
+
+        states = sim.states
+        states.queueArea -= cut['queueArea']
+        states.totalDelay -= cut['totalDelay']
+        states.totalServed -= cut['totalServed']
+        states.totalServingTime -= cut['totalServingTime']
+        if 'histograms' in cut:
+            for histogram, weights in zip((states.queueHistogram, states.systemHistogram), cut['histograms']):
+                histogram.weights = [a - b for a, b in zip(histogram.weights, weights)]
+        states.warmupTime = self.warmupTime
+
+
+def detectWarmup(sim, checkpointInterval=None, batchSize=5):
+    # sim must be configured; attaches the detector, the caller then runs the simulation
+    if sim.checkpointInterval is None:
+        if checkpointInterval is None:
+            if sim.params.timeLimit is not None:
+                checkpointInterval = sim.params.timeLimit / 500.0
+            else:
+                checkpointInterval = 100.0 / sim.params.lambd
+        sim.checkpointInterval = checkpointInterval
+
+    detector = MserWarmup(batchSize)
+    sim.observers.append(detector)
+    return detector
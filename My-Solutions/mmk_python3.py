@@ -9,8 +9,13 @@ For the sake of comparison, while plotting results from simulation, also produce
 """
 
 import heapq
+import os
 import random
-import matplotlib.pyplot as plt
+import sys
+
+# the figure export is shared with the solution in 1505038
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '1505038'))
+from Reporting import renderFigures, sweepFigure
 
 
 # Parameters
@@ -164,42 +169,21 @@ def experiment1():
     sim.printResults()
 
 
-def experiment2():
+def experiment2(outputDir='figures', formats=('png',)):
     seed = 110
     mu = 1000.0 / 60
     ratios = [u / 10.0 for u in range(1, 11)]
 
-    avglength = []
-    avgdelay = []
-    util = []
-
+    results = []
     for ro in ratios:
         sim = Simulator(seed)
         sim.configure(Params(mu * ro, mu, 1), States())
         sim.run()
+        results.append(sim.getResults())
 
-        length, delay, utl = sim.getResults()
-        avglength.append(length)
-        avgdelay.append(delay)
-        util.append(utl)
-
-    plt.figure(1)
-    plt.subplot(311)
-    plt.plot(ratios, avglength)
-    plt.xlabel('Ratio (ro)')
-    plt.ylabel('Avg Q length')
-
-    plt.subplot(312)
-    plt.plot(ratios, avgdelay)
-    plt.xlabel('Ratio (ro)')
-    plt.ylabel('Avg Q delay (sec)')
-
-    plt.subplot(313)
-    plt.plot(ratios, util)
-    plt.xlabel('Ratio (ro)')
-    plt.ylabel('Util')
-
-    plt.show()
+    # written to outputDir with the Agg backend instead of shown in a window
+    figure = sweepFigure('experiment2', ratios, results, 'Ratio (ro)')
+    return renderFigures([figure], outputDir, formats)
 
 
 def experiment3():